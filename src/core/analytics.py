@@ -0,0 +1,124 @@
+# Level analytics: whole-array metrics of generated maps
+import numpy as np
+import tcod
+from core.map import TERRAIN_MOSS
+from core.regions import label_regions
+from core.rooms import ROOM_TYPES
+
+TERRAIN_COUNT = TERRAIN_MOSS + 1  # Number of terrain types
+
+def terrain_histograms(tiles):
+    """Count the tiles of each terrain type; tiles may be a stack of maps of one size"""
+    tiles = np.asarray(tiles)
+    flat = tiles.reshape(-1, tiles.shape[-2] * tiles.shape[-1]).astype(np.intp)
+    # Offset each map's terrain values so a single bincount covers the whole stack
+    offsets = np.arange(len(flat))[:, np.newaxis] * TERRAIN_COUNT
+    counts = np.bincount((flat + offsets).ravel(), minlength=len(flat) * TERRAIN_COUNT)
+    return counts.reshape(tiles.shape[:-2] + (TERRAIN_COUNT,))
+
+def walkable_neighbor_counts(walkable):
+    """Count the walkable 4-neighbors of every tile of one or more walkable masks"""
+    padded = np.pad(walkable, [(0, 0)] * (walkable.ndim - 2) + [(1, 1), (1, 1)]).astype(np.int8)
+    return (padded[..., :-2, 1:-1] + padded[..., 2:, 1:-1] +
+            padded[..., 1:-1, :-2] + padded[..., 1:-1, 2:])
+
+def dead_end_counts(walkable):
+    """Count walkable tiles with exactly one walkable neighbor in one or more masks"""
+    dead_ends = walkable & (walkable_neighbor_counts(walkable) == 1)
+    return dead_ends.sum(axis=(-2, -1))
+
+def room_type_counts(game_map):
+    """Count the rooms of each type in ROOM_TYPES order"""
+    counts = np.zeros(len(ROOM_TYPES), dtype=np.int32)
+    for room in game_map.rooms:
+        counts[ROOM_TYPES.index(room['type'])] += 1
+    return counts
+
+def stairs_path_length(game_map):
+    """Get the walking distance between the stairs, or -1 without both stairs"""
+    if not (game_map.stairs_up and game_map.stairs_down):
+        return -1
+    return int(game_map.distance_from_stairs("up")[game_map.stairs_down])
+
+def level_metrics(game_map):
+    """Compute the metrics of a single level"""
+    walkable = game_map.walkable_mask()
+    return {
+        'walkable_fraction': float(walkable.mean()),
+        'terrain_histogram': terrain_histograms(game_map.tiles),
+        'region_count': len(label_regions(walkable)[1]),
+        'stairs_path_length': stairs_path_length(game_map),
+        'dead_ends': int(dead_end_counts(walkable)),
+        'room_types': room_type_counts(game_map),
+    }
+
+def batch_metrics(maps):
+    """Compute the metrics of many levels, returning {metric: array with one entry per map}
+
+    Maps of the same size are stacked so the per-tile metrics run over the whole batch
+    in single array operations.
+    """
+    metrics = {
+        'walkable_fraction': np.zeros(len(maps)),
+        'terrain_histogram': np.zeros((len(maps), TERRAIN_COUNT), dtype=np.int64),
+        'region_count': np.zeros(len(maps), dtype=np.int32),
+        'stairs_path_length': np.zeros(len(maps), dtype=np.int32),
+        'dead_ends': np.zeros(len(maps), dtype=np.int64),
+        'room_types': np.zeros((len(maps), len(ROOM_TYPES)), dtype=np.int32),
+    }
+
+    by_shape = {}
+    for i, game_map in enumerate(maps):
+        by_shape.setdefault(game_map.tiles.shape, []).append(i)
+    for indices in by_shape.values():
+        walkable = np.stack([maps[i].walkable_mask() for i in indices])
+        metrics['walkable_fraction'][indices] = walkable.mean(axis=(1, 2))
+        metrics['terrain_histogram'][indices] = terrain_histograms(np.stack([maps[i].tiles for i in indices]))
+        metrics['dead_ends'][indices] = dead_end_counts(walkable)
+
+    # Labeling and pathing work on one map at a time
+    for i, game_map in enumerate(maps):
+        metrics['region_count'][i] = len(label_regions(game_map.walkable_mask())[1])
+        metrics['stairs_path_length'][i] = stairs_path_length(game_map)
+        metrics['room_types'][i] = room_type_counts(game_map)
+    return metrics
+
+def room_type_distribution(metrics):
+    """Get the observed fraction of rooms of each type across a batch"""
+    totals = metrics['room_types'].sum(axis=0)
+    return dict(zip(ROOM_TYPES, totals / max(1, totals.sum())))
+
+def main_path(game_map):
+    """Get the shortest walking path between the level's entry and exit as (x, y) arrays, or None
+
+    The entry is the up stairs, or the spawn point on the outdoor level.
+    """
+    start = game_map.stairs_up or game_map.spawn_point
+    end = game_map.stairs_down
+    if not (start and end):
+        return None
+    distance = game_map.distance_from(start)
+    if distance[end] < 0:
+        return None
+    # hillclimb2d needs unreachable tiles to compare as far away
+    distance = np.where(distance < 0, np.iinfo(np.int32).max, distance).astype(np.int32)
+    path = tcod.path.hillclimb2d(distance, end, True, False)
+    return path[:, 0], path[:, 1]
+
+def terrain_near_path(game_map, path, terrain):
+    """Count tiles of a terrain type within one tile of a path"""
+    near = np.zeros(game_map.tiles.shape, dtype=bool)
+    path_x, path_y = path
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            near[np.clip(path_x + dx, 0, game_map.width - 1), np.clip(path_y + dy, 0, game_map.height - 1)] = True
+    return int((near & (game_map.tiles == terrain)).sum())
+
+def npc_reachable(game_map, name):
+    """Check if an NPC with the given name can be reached from the level's entry"""
+    start = game_map.stairs_up or game_map.spawn_point
+    if not start:
+        return False
+    # Walking distances ignore NPCs, so the NPC's own tile is reachable if a neighbor is
+    distance = game_map.distance_from(start)
+    return any(npc.name == name and distance[npc.x, npc.y] >= 0 for npc in game_map.npcs)
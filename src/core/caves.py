@@ -0,0 +1,29 @@
+# Cellular-automata cave generation for deep levels
+import numpy as np
+from core.regions import largest_region
+
+CAVE_MIN_LEVEL = 7  # Shallowest level that can be a cave
+CAVE_LEVEL_CHANCE = 0.5  # Chance for a deep level to be a cave instead of rooms and corridors
+CAVE_INITIAL_WALL_CHANCE = 0.45  # Chance for each tile to start as wall
+CAVE_SMOOTHING_STEPS = 5
+CAVE_WALL_THRESHOLD = 5  # Walls in the 3x3 block (including the tile) that make a wall
+
+def wall_counts(walls):
+    """Count the walls in the 3x3 block around every tile, treating the outside as wall"""
+    padded = np.pad(walls, 1, constant_values=True).astype(np.int8)
+    width, height = walls.shape
+    return sum(padded[dx:dx + width, dy:dy + height] for dx in range(3) for dy in range(3))
+
+def cave_walls(width, height, rng, steps=CAVE_SMOOTHING_STEPS):
+    """Generate a boolean wall mask for a cave using the 4-5 cellular-automata rule
+
+    A tile becomes wall when it is wall with at least 4 wall neighbors or floor with
+    at least 5, i.e. when its 3x3 block holds CAVE_WALL_THRESHOLD walls. Only the
+    largest connected floor region is kept.
+    """
+    walls = rng.random((width, height)) < CAVE_INITIAL_WALL_CHANCE
+    for _ in range(steps):
+        walls = wall_counts(walls) >= CAVE_WALL_THRESHOLD
+        walls[[0, -1], :] = True
+        walls[:, [0, -1]] = True
+    return ~largest_region(~walls)
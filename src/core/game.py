@@ -3,20 +3,30 @@ import tcod
 import numpy as np
 import pickle
 import os
+import random
+import time
+import uuid
 from datetime import datetime
-from core.map import Map
+from core.map import Map, generate_world_level
 from core.player import Player, Attribute, Skill
 from core.item import Item
+from core.keymap import MOVE_KEYS
+from core.npc import restore_npc, get_dialogue_for_npc
+from core.replay import ReplayRecorder
+from core.saving import SaveStore, SaveWriter, read_save, list_save_entries, write_memmap_save
 from utils.constants import *
-from rendering.renderer import Renderer
 
 class Game:
     _instance = None
 
-    def __init__(self):
+    def __init__(self, seed=None, memmap_levels=MEMMAP_LEVELS, generate=True):
+        """Create a game; with generate=False no level is built until generate_world() or load_game()"""
+        # The world generator is seeded from this so a session can be replayed deterministically
+        self.seed = seed if seed is not None else random.randrange(2 ** 32)
+
         # Initialize game dimensions and state
-        self.width = 80  # Width of the game window in tiles
-        self.height = 50  # Height of the game window in tiles
+        self.width = MAP_WIDTH  # Width of the game window in tiles
+        self.height = MAP_HEIGHT  # Height of the game window in tiles
         self.levels = {}  # Dictionary to store all game levels
         self.current_level = 0  # Start at level 0 (outdoor level)
         self.player = None  # Will be initialized in initialize_level
@@ -25,23 +35,111 @@ class Game:
         self.last_save_point = None  # Store the last save point coordinates
         self.last_save_level = None  # Store the level of the last save point
         self.message = None  # Store the current message to display
-        self.message_timer = 0  # Timer for message display
-        self.initialize_level(self.current_level)  # Set up the first level
+        self.message_timer = 0  # Ticks left to display the message
+        self.save_dir = SAVE_DIR  # Directory for save files
+        self.recorder = None  # Replay recorder for the current session, if any
+        self.save_writer = None  # Background save writer, created on first save
+        self.play_time = 0.0  # Seconds played before the current session
+        self.save_store = None  # Blob store for the save directory, created on first use
+        self.memmap_levels = memmap_levels  # Keep level arrays in memory-mapped files once saved
+        self.world_id = None  # Name of the memory-mapped world directory and its rolling save
+        self.session_start = time.monotonic()  # When the current session started
+        if generate:
+            self.generate_world()
         Game._instance = self
 
+    def generate_world(self):
+        """Seed the game's random state and set up the first level"""
+        random.seed(self.seed)
+        self.initialize_level(self.current_level)
+        self.session_start = time.monotonic()
+
     @classmethod
     def get_instance(cls):
         """Get the current game instance"""
         return cls._instance
 
+    def start_recording(self, replay_dir="replays"):
+        """Start recording this session's input to a replay log"""
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.recorder = ReplayRecorder(os.path.join(replay_dir, f"replay_{timestamp}.rpl"), self.seed)
+
+    def stop_recording(self):
+        """Stop recording and write the final state hash to the replay log"""
+        if self.recorder:
+            self.recorder.close(self)
+            self.recorder = None
+
     def save_game(self):
         """Save the current game state to a file"""
-        # Create saves directory if it doesn't exist
-        os.makedirs("saves", exist_ok=True)
-        
+        # Get the store first: a new save directory makes the snapshot include every level
+        store = self.get_save_store()
+        save_path, save_data, arrays = self.snapshot_save()
+        if self.memmap_levels:
+            success, message = write_memmap_save(save_path, save_data, arrays)
+        else:
+            success, message = store.write(save_path, save_data)
+        if not success:
+            self.forget_saved_levels()
+        return success, message
+
+    def forget_saved_levels(self):
+        """Make the next save write every level in full, e.g. after a failed save"""
+        if self.save_store:
+            self.save_store.level_blobs = {}
+        for level in self.levels.values():
+            level.dirty = True
+            level.saved_files = None
+
+    def save_game_async(self):
+        """Snapshot the game state and write it on a background thread
+
+        Completion is reported through game.message by update().
+        """
+        store = self.get_save_store()
+        if self.save_writer is None or self.save_writer.store is not store:
+            self.save_writer = SaveWriter(store)
+        save_path, save_data, arrays = self.snapshot_save()
+        if self.memmap_levels:
+            self.save_writer.submit(save_path, save_data, write_memmap_save, arrays)
+        else:
+            self.save_writer.submit(save_path, save_data)
+
+    def get_save_store(self):
+        """Get the blob store of the current save directory"""
+        if self.save_store is None or self.save_store.save_dir != self.save_dir:
+            # Wait for saves queued to the old store, then start from full copies
+            self.wait_for_saves()
+            self.save_store = SaveStore(self.save_dir)
+            self.forget_saved_levels()
+        return self.save_store
+
+    def wait_for_saves(self):
+        """Block until all background saves have been written"""
+        if self.save_writer:
+            self.save_writer.wait()
+
+    def get_play_time(self):
+        """Get the total play time in seconds"""
+        return self.play_time + time.monotonic() - self.session_start
+
+    def snapshot_save(self):
+        """Copy the game state into a save dict, returning (save path, save data, arrays)
+
+        arrays maps paths in the save directory to copies of the level arrays that a
+        memory-mapped save writes next to the save file; it is empty otherwise.
+        """
         # Create a timestamp for the save file
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        save_path = f"saves/save_{timestamp}.sav"
+        save_path = os.path.join(self.save_dir, f"save_{timestamp}.sav")
+        if self.world_id is None:
+            self.world_id = timestamp  # Identifies this playthrough's saves
+        if self.memmap_levels:
+            # Memory-mapped worlds keep one rolling save next to their array files
+            save_path = os.path.join(self.save_dir, f"save_{self.world_id}.sav")
+            world_dir = os.path.join("worlds", self.world_id)
+            save_id = uuid.uuid4().hex[:12]  # Names this save's array files, which are never overwritten
+        arrays = {}
         
         # Prepare save data
         save_data = {
@@ -50,11 +148,14 @@ class Game:
             'current_level': self.current_level,
             'last_save_point': self.last_save_point,  # Save the last save point
             'last_save_level': self.last_save_level,  # Save the level of the last save point
+            'saved_at': timestamp,
+            'world_id': self.world_id,
+            'play_time': self.get_play_time(),
             'player': {
                 'x': self.player.x,
                 'y': self.player.y,
-                'attributes': self.player.attributes,
-                'skills': self.player.skills,
+                'attributes': dict(self.player.attributes),
+                'skills': dict(self.player.skills),
                 'hp': self.player.hp,
                 'max_hp': self.player.max_hp,
                 'stamina': self.player.stamina,
@@ -75,31 +176,50 @@ class Game:
         
         # Save each level's data
         for level_num, level in self.levels.items():
-            save_data['levels'][level_num] = {
-                'tiles': level.tiles,
-                'visible': level.visible,
-                'explored': level.explored,
-                'stairs_up': level.stairs_up,
-                'stairs_down': level.stairs_down,
-                'stairs_discovered': level.stairs_discovered,
-                'is_outdoor': level.is_outdoor,
-                'spawn_point': level.spawn_point,
-                'save_point': level.save_point  # Save the save point for each level
-            }
-        
-        # Save to file
-        try:
-            with open(save_path, 'wb') as f:
-                pickle.dump(save_data, f)
-            return True, f"Game saved to {save_path}"
-        except Exception as e:
-            return False, f"Failed to save game: {str(e)}"
+            if self.memmap_levels:
+                # Changed levels are copied now and written to new files by the writer;
+                # unchanged ones keep the files of the previous save
+                if level.has_unsaved_changes() or level.saved_files is None:
+                    files = level.storage_files(save_id)
+                    for name, filename in files.items():
+                        arrays[os.path.join(world_dir, filename)] = getattr(level, name).copy()
+                    level.saved_files = files
+                    level.mark_saved()
+                save_data['levels'][level_num] = dict(self.get_level_state(level), memmap=world_dir,
+                                                      arrays=level.saved_files)
+                continue
+
+            # Unchanged levels are left as None and reuse the blob of the previous save
+            if not level.has_unsaved_changes():
+                save_data['levels'][level_num] = None
+                continue
+
+            # Arrays are copied so the game can keep mutating them
+            save_data['levels'][level_num] = dict(
+                self.get_level_state(level),
+                tiles=level.tiles.copy(),
+                visible=level.visible.copy(),
+                explored=level.explored.copy()
+            )
+            level.mark_saved()
+        return save_path, save_data, arrays
+
+    def get_level_state(self, level):
+        """Get the saved state of a level, except for its per-tile arrays"""
+        return {
+            'stairs_up': level.stairs_up,
+            'stairs_down': level.stairs_down,
+            'stairs_discovered': dict(level.stairs_discovered),
+            'is_outdoor': level.is_outdoor,
+            'spawn_point': level.spawn_point,
+            'save_point': level.save_point,  # Save the save point for each level
+            'npcs': level.get_npc_state()
+        }
 
     def load_game(self, save_path):
         """Load a game state from a file"""
         try:
-            with open(save_path, 'rb') as f:
-                save_data = pickle.load(f)
+            save_data = read_save(save_path)
             
             # Restore basic game state
             self.width = save_data['width']
@@ -107,6 +227,9 @@ class Game:
             self.current_level = save_data['current_level']
             self.last_save_point = save_data.get('last_save_point')  # Restore last save point
             self.last_save_level = save_data.get('last_save_level')  # Restore last save level
+            self.play_time = save_data.get('play_time', 0.0)
+            self.world_id = save_data.get('world_id')  # Saves made from here on join the loaded playthrough
+            self.session_start = time.monotonic()
             
             # Restore player data
             player_data = save_data['player']
@@ -130,17 +253,9 @@ class Game:
                 Skill.HEALING: 1
             })
             
-            # Restore health and stamina
+            # Restore health and stamina (max values are derived from attributes)
             self.player.hp = player_data['hp']
-            self.player.max_hp = player_data['max_hp']
             self.player.stamina = player_data.get('stamina', self.player.max_stamina)
-            self.player.max_stamina = player_data.get('max_stamina', self.player.calculate_max_stamina())
-            
-            # Restore combat stats
-            self.player.defense = player_data['defense']
-            self.player.attack_power = player_data.get('attack_power', self.player.calculate_attack_power())
-            self.player.critical_chance = player_data.get('critical_chance', self.player.calculate_critical_chance())
-            self.player.dodge_chance = player_data.get('dodge_chance', self.player.calculate_dodge_chance())
             
             # Restore level and experience
             self.player.level = player_data['level']
@@ -155,20 +270,35 @@ class Game:
                 item_type, x, y = item_data
                 self.player.inventory.append(Item(item_type, x, y))
             
-            # Restore levels
+            # Restore levels, reading them from the blob store
+            store = self.get_save_store()
+            store.level_blobs = {}
             self.levels = {}
-            for level_num, level_data in save_data['levels'].items():
-                level = Map(self.width, self.height, int(level_num))
-                level.tiles = level_data['tiles']
-                level.visible = level_data['visible']
-                level.explored = level_data['explored']
+            for level_num, level_data in store.read_levels(save_data).items():
+                # Levels saved with their NPCs don't need to be generated first
+                level = Map(self.width, self.height, int(level_num), generate='npcs' not in level_data)
+                if 'memmap' in level_data:
+                    # Pages of memory-mapped arrays are only read when touched
+                    level.open_storage(os.path.join(self.save_dir, level_data['memmap']), level_data.get('arrays'))
+                    self.memmap_levels = True
+                    self.world_id = os.path.basename(level_data['memmap'])
+                else:
+                    level.tiles = level_data['tiles']
+                    level.visible = level_data['visible']
+                    level.explored = level_data['explored']
                 level.stairs_up = level_data['stairs_up']
                 level.stairs_down = level_data['stairs_down']
                 level.stairs_discovered = level_data['stairs_discovered']
                 level.is_outdoor = level_data['is_outdoor']
                 level.spawn_point = level_data['spawn_point']
                 level.save_point = level_data.get('save_point')  # Restore save point for each level
+                if 'npcs' in level_data:
+                    level.npcs = [restore_npc(state) for state in level_data['npcs']]
                 self.levels[int(level_num)] = level
+                # Levels read from a blob are unchanged until the player changes them
+                if 'blob' in save_data['levels'][level_num]:
+                    store.level_blobs[int(level_num)] = save_data['levels'][level_num]['blob']
+                    level.mark_saved()
             
             # Update FOV for current position
             self.levels[self.current_level].update_fov(self.player.x, self.player.y)
@@ -177,24 +307,19 @@ class Game:
             return False, f"Failed to load game: {str(e)}"
 
     def list_saves(self):
-        """List all available save files"""
-        if not os.path.exists("saves"):
-            return []
-        
-        saves = []
-        for filename in os.listdir("saves"):
-            if filename.endswith(".sav"):
-                save_path = os.path.join("saves", filename)
-                timestamp = filename[5:-4]  # Remove 'save_' prefix and '.sav' suffix
-                saves.append((save_path, timestamp))
-        
-        return sorted(saves, key=lambda x: x[1], reverse=True)  # Sort by timestamp, newest first
+        """List all available saves as (save path, timestamp) pairs, newest first"""
+        return [(os.path.join(self.save_dir, entry['path']), entry['timestamp'])
+                for entry in self.list_save_entries()]
+
+    def list_save_entries(self):
+        """List the manifest entries of all saves, newest first, without opening the save files"""
+        return list_save_entries(self.save_dir)
 
     def initialize_level(self, level):
         """Initialize a new level and place the player appropriately"""
         # Create the level if it doesn't exist
         if level not in self.levels:
-            self.levels[level] = Map(self.width, self.height, level)
+            self.levels[level] = generate_world_level(self.seed, level, self.width, self.height)
         
         # Initialize player if not exists
         if self.player is None:
@@ -206,47 +331,40 @@ class Game:
                 self.player.x, self.player.y = self.levels[level].spawn_point
             else:
                 # Find a walkable position near the center
-                center_x, center_y = self.width // 2, self.height // 2
-                for dx in range(-5, 6):
-                    for dy in range(-5, 6):
-                        x, y = center_x + dx, center_y + dy
-                        if self.levels[level].is_walkable(x, y):
-                            self.player.x, self.player.y = x, y
-                            break
+                position = self.levels[level].nearest_walkable(self.width // 2, self.height // 2, max_distance=5)
+                if position:
+                    self.player.x, self.player.y = position
         else:  # Dungeon level
             # If coming from above (down stairs), place near up stairs
             if level > 0 and self.levels[level].stairs_up:
                 self.player.x, self.player.y = self.levels[level].stairs_up
                 # Move one tile away from stairs if possible
-                for dx, dy in [(0, 1), (1, 0), (0, -1), (-1, 0)]:
-                    new_x, new_y = self.player.x + dx, self.player.y + dy
-                    if self.levels[level].is_walkable(new_x, new_y):
-                        self.player.x, self.player.y = new_x, new_y
-                        break
+                self.player.x, self.player.y = self.levels[level].step_away_from(self.player.x, self.player.y)
             # If coming from below (up stairs), place near down stairs
             elif level < MAX_LEVELS - 1 and self.levels[level].stairs_down:
                 self.player.x, self.player.y = self.levels[level].stairs_down
                 # Move one tile away from stairs if possible
-                for dx, dy in [(0, 1), (1, 0), (0, -1), (-1, 0)]:
-                    new_x, new_y = self.player.x + dx, self.player.y + dy
-                    if self.levels[level].is_walkable(new_x, new_y):
-                        self.player.x, self.player.y = new_x, new_y
-                        break
+                self.player.x, self.player.y = self.levels[level].step_away_from(self.player.x, self.player.y)
             else:
                 # If no stairs are available, find a walkable position near the center
-                center_x, center_y = self.width // 2, self.height // 2
-                for dx in range(-5, 6):
-                    for dy in range(-5, 6):
-                        x, y = center_x + dx, center_y + dy
-                        if self.levels[level].is_walkable(x, y):
-                            self.player.x, self.player.y = x, y
-                            break
+                position = self.levels[level].nearest_walkable(self.width // 2, self.height // 2, max_distance=5)
+                if position:
+                    self.player.x, self.player.y = position
 
         # Update field of view for the new position
         self.levels[level].update_fov(self.player.x, self.player.y)
 
     def handle_input(self, event):
         """Handle player input and return False if game should quit, 'menu' if should return to menu"""
+        if self.recorder:
+            self.recorder.record_event(event)
+            # Moves caused by this event are replayed from the event itself
+            with self.recorder.suspended():
+                return self._handle_input(event)
+        return self._handle_input(event)
+
+    def _handle_input(self, event):
+        """Apply a single input event"""
         # Handle quit events
         if isinstance(event, tcod.event.Quit):
             return 'menu'
@@ -280,33 +398,15 @@ class Game:
             if event.sym == tcod.event.KeySym.SPACE:
                 current_map = self.levels[self.current_level]
                 if current_map.is_save_point(self.player.x, self.player.y):
-                    success, message = self.save_game()
                     self.last_save_point = (self.player.x, self.player.y)
                     self.last_save_level = self.current_level
-                    self.message = "Game saved!"
-                    self.message_timer = 60  # Show message for 60 frames
+                    self.save_game_async()
+                    self.show_message("Saving...")
                     return True
 
-            # Handle movement keys
-            # Arrow keys and numpad for 8-directional movement
-            if event.sym == tcod.event.KeySym.UP or event.sym == tcod.event.KeySym.KP_8:
-                self.try_move(0, -1)  # Move up
-            elif event.sym == tcod.event.KeySym.DOWN or event.sym == tcod.event.KeySym.KP_2:
-                self.try_move(0, 1)   # Move down
-            elif event.sym == tcod.event.KeySym.LEFT or event.sym == tcod.event.KeySym.KP_4:
-                self.try_move(-1, 0)  # Move left
-            elif event.sym == tcod.event.KeySym.RIGHT or event.sym == tcod.event.KeySym.KP_6:
-                self.try_move(1, 0)   # Move right
-            elif event.sym == tcod.event.KeySym.KP_7:
-                self.try_move(-1, -1) # Move up-left
-            elif event.sym == tcod.event.KeySym.KP_9:
-                self.try_move(1, -1)  # Move up-right
-            elif event.sym == tcod.event.KeySym.KP_1:
-                self.try_move(-1, 1)  # Move down-left
-            elif event.sym == tcod.event.KeySym.KP_3:
-                self.try_move(1, 1)   # Move down-right
-
-            # Handle inventory keys
+            # Handle movement and inventory keys
+            if event.sym in MOVE_KEYS:
+                self.try_move(*MOVE_KEYS[event.sym])
             elif event.sym == tcod.event.KeySym.i:  # Inventory
                 self.player.select_next_item()
             elif event.sym == tcod.event.KeySym.u:  # Use item
@@ -316,7 +416,19 @@ class Game:
         return True
 
     def try_move(self, dx, dy):
-        """Try to move the player and handle level transitions"""
+        """Try to move the player and update the field of view"""
+        self.move_player(dx, dy)
+        self.refresh_view()
+
+    def move_player(self, dx, dy):
+        """Try to move the player and handle level transitions, taking one turn
+
+        The field of view is left for refresh_view(), so several moves applied in one
+        frame only recompute it once.
+        """
+        if self.recorder:
+            self.recorder.record_move(dx, dy)
+
         new_x = self.player.x + dx
         new_y = self.player.y + dy
 
@@ -335,11 +447,7 @@ class Game:
             if self.levels[self.current_level].stairs_down:
                 self.player.x, self.player.y = self.levels[self.current_level].stairs_down
                 # Move one tile away from stairs if possible
-                for dx, dy in [(0, 1), (1, 0), (0, -1), (-1, 0)]:
-                    new_x, new_y = self.player.x + dx, self.player.y + dy
-                    if self.levels[self.current_level].is_walkable(new_x, new_y):
-                        self.player.x, self.player.y = new_x, new_y
-                        break
+                self.player.x, self.player.y = self.levels[self.current_level].step_away_from(self.player.x, self.player.y)
         elif stairs == "down" and self.current_level < MAX_LEVELS - 1:
             # Store current position before changing levels
             old_x, old_y = self.player.x, self.player.y
@@ -349,22 +457,66 @@ class Game:
             if self.levels[self.current_level].stairs_up:
                 self.player.x, self.player.y = self.levels[self.current_level].stairs_up
                 # Move one tile away from stairs if possible
-                for dx, dy in [(0, 1), (1, 0), (0, -1), (-1, 0)]:
-                    new_x, new_y = self.player.x + dx, self.player.y + dy
-                    if self.levels[self.current_level].is_walkable(new_x, new_y):
-                        self.player.x, self.player.y = new_x, new_y
-                        break
+                self.player.x, self.player.y = self.levels[self.current_level].step_away_from(self.player.x, self.player.y)
         else:
             # Normal movement
             self.player.x = new_x
             self.player.y = new_y
 
-        # Update field of view after movement
-        self.levels[self.current_level].update_fov(self.player.x, self.player.y)
-        
         # Update player state
         self.player.update()
 
+    def refresh_view(self):
+        """Recompute the field of view, and with it the explored tiles and discovered stairs"""
+        if self.recorder:
+            self.recorder.record_view()
+        self.levels[self.current_level].update_fov(self.player.x, self.player.y)
+
+    def use_item(self, index):
+        """Use an inventory item, removing it if it was consumed, and return whether it was"""
+        if self.recorder:
+            self.recorder.record_use(index)
+        if 0 <= index < len(self.player.inventory) and self.player.inventory[index].use(self.player):
+            self.player.inventory.pop(index)
+            return True
+        return False
+
+    def drop_item(self, index):
+        """Drop an inventory item and return it, or None if there is no such item"""
+        if self.recorder:
+            self.recorder.record_drop(index)
+        return self.player.remove_from_inventory(index)
+
+    def talk_to(self, npc):
+        """Start a conversation with an NPC at the dialogue that fits its state"""
+        if self.recorder:
+            self.recorder.record_talk(npc.x, npc.y)
+        npc.start_dialogue(get_dialogue_for_npc(npc))
+
+    def choose_dialogue_option(self, npc, index):
+        """Choose an option of an NPC's current dialogue
+
+        Returns the next dialogue ID, or None if the option ended the conversation.
+        """
+        if self.recorder:
+            self.recorder.record_choice(index)
+        next_dialogue = npc.select_option(index)
+        if next_dialogue:
+            npc.start_dialogue(next_dialogue)
+        else:
+            npc.end_dialogue()
+        return next_dialogue
+
+    def end_dialogue(self, npc):
+        """End the conversation with an NPC"""
+        if self.recorder:
+            self.recorder.record_leave()
+        npc.end_dialogue()
+
+    def get_talking_npc(self):
+        """Get the NPC of the current level that the player is talking to, if any"""
+        return next((npc for npc in self.levels[self.current_level].npcs if npc.is_talking), None)
+
     def respawn_player(self):
         """Respawn the player at the last save point"""
         if self.last_save_point and self.last_save_level is not None:
@@ -381,23 +533,42 @@ class Game:
             # If no save point, use the level's spawn point
             self.initialize_level(self.current_level)
 
+    def show_message(self, message, duration=MESSAGE_DURATION):
+        """Display a message for duration seconds of simulation ticks"""
+        self.message = message
+        self.message_timer = max(1, round(duration * TICK_RATE))
+
     def update(self):
-        """Update game state"""
+        """Advance the game by one simulation tick, returning True if anything visible changed"""
+        changed = False
+
+        # Report finished background saves
+        if self.save_writer:
+            for success, message in self.save_writer.poll():
+                if not success:
+                    self.forget_saved_levels()
+                self.show_message("Game saved!" if success else message)
+                changed = True
+
         # Update message timer
         if self.message_timer > 0:
             self.message_timer -= 1
             if self.message_timer == 0:
                 self.message = None
+                changed = True
 
         # Check if player is dead and respawn if needed
         if not self.player.is_alive:
             self.respawn_player()
+            changed = True
+        return changed
 
 def main():
-    # Initialize the game window and console
-    tileset = tcod.tileset.load_tilesheet(
-        "dejavu10x10_gs_tc.png", 32, 8, tcod.tileset.CHARMAP_TCOD
-    )
+    from rendering.renderer import Renderer
+    from rendering.tilesets import TilesetManager
+
+    # Initialize the game window and console; the tileset is built from cached glyphs
+    tileset = TilesetManager().get_tileset()
     console = tcod.console.Console(80, 50)
     context = tcod.context.new_terminal(
         columns=80,
@@ -1,3 +1,8 @@
+from core.player import Attribute
+
+# Number of turns temporary potion effects last
+POTION_EFFECT_DURATION = 100
+
 class Item:
     def __init__(self, name, description, value=0):
         self.name = name
@@ -35,7 +40,7 @@ class StrengthPotion(Item):
         super().__init__("Strength Potion", "Temporarily increases strength by 5", value=75)
 
     def use(self, player):
-        player.strength += 5
+        player.add_modifier(Attribute.STRENGTH, 5, POTION_EFFECT_DURATION)
         return True
 
 class DefensePotion(Item):
@@ -43,5 +48,5 @@ class DefensePotion(Item):
         super().__init__("Defense Potion", "Temporarily increases defense by 5", value=75)
 
     def use(self, player):
-        player.defense += 5
+        player.add_modifier('defense', 5, POTION_EFFECT_DURATION)
         return True 
\ No newline at end of file
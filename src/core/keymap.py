@@ -0,0 +1,111 @@
+# Key bindings and modal input dispatch
+#
+# Input goes to the mode on top of a stack (gameplay at the bottom, with the pause menu
+# or a screen pushed over it). Each mode has a table of key -> (action, *arguments), so
+# handling a key press is two dict lookups and rebinding a key is a change to the table.
+import tcod
+
+KeySym = tcod.event.KeySym
+
+# Input modes
+MODE_GAMEPLAY = "gameplay"
+MODE_INVENTORY = "inventory"
+MODE_DIALOGUE = "dialogue"
+MODE_PAUSE = "pause"
+MODE_CHARACTER = "character"
+
+# Arrow keys and numpad for 8-directional movement
+MOVE_KEYS = {
+    KeySym.UP: (0, -1), KeySym.KP_8: (0, -1),
+    KeySym.DOWN: (0, 1), KeySym.KP_2: (0, 1),
+    KeySym.LEFT: (-1, 0), KeySym.KP_4: (-1, 0),
+    KeySym.RIGHT: (1, 0), KeySym.KP_6: (1, 0),
+    KeySym.KP_7: (-1, -1),
+    KeySym.KP_9: (1, -1),
+    KeySym.KP_1: (-1, 1),
+    KeySym.KP_3: (1, 1),
+}
+
+DEFAULT_KEYMAP = {
+    MODE_GAMEPLAY: {
+        **{sym: ("move", dx, dy) for sym, (dx, dy) in MOVE_KEYS.items()},
+        KeySym.ESCAPE: ("pause",),
+        KeySym.c: ("character_screen",),
+        KeySym.i: ("inventory",),
+        KeySym.SPACE: ("interact",),
+    },
+    MODE_INVENTORY: {
+        KeySym.ESCAPE: ("close",),
+        KeySym.i: ("close",),
+        KeySym.UP: ("select", -1),
+        KeySym.DOWN: ("select", 1),
+        KeySym.SPACE: ("use",),
+        KeySym.d: ("drop",),
+    },
+    MODE_DIALOGUE: {
+        KeySym.ESCAPE: ("close",),
+        KeySym.UP: ("select", -1),
+        KeySym.DOWN: ("select", 1),
+        KeySym.SPACE: ("choose",),
+    },
+    MODE_PAUSE: {
+        KeySym.ESCAPE: ("resume",),
+        KeySym.N1: ("resume",), KeySym.KP_1: ("resume",),
+        KeySym.N2: ("main_menu",), KeySym.KP_2: ("main_menu",),
+        KeySym.N3: ("quit",), KeySym.KP_3: ("quit",),
+    },
+    MODE_CHARACTER: {
+        KeySym.ESCAPE: ("close",),
+        KeySym.c: ("close",),
+    },
+}
+
+class InputDispatcher:
+    def __init__(self, handlers, keymap=DEFAULT_KEYMAP, mode=MODE_GAMEPLAY):
+        """Initialize a dispatcher of key presses to handlers[mode][action]
+
+        Handlers are called with the event followed by the arguments of the binding.
+        The keymap is copied, so rebinding keys never changes DEFAULT_KEYMAP.
+        """
+        self.handlers = handlers
+        self.keymap = {bound_mode: dict(bindings) for bound_mode, bindings in keymap.items()}
+        self.modes = [mode]
+
+    @property
+    def mode(self):
+        """Get the mode that currently receives input"""
+        return self.modes[-1]
+
+    def push(self, mode):
+        """Give input to a mode until it is popped"""
+        self.modes.append(mode)
+
+    def pop(self):
+        """Return input to the previous mode; the bottom mode is never popped"""
+        if len(self.modes) > 1:
+            self.modes.pop()
+
+    def reset(self, mode=MODE_GAMEPLAY):
+        """Drop every pushed mode and give input to mode"""
+        self.modes = [mode]
+
+    def bind(self, mode, sym, action, *args):
+        """Bind a key in a mode to an action, replacing its previous binding"""
+        self.keymap[mode][sym] = (action, *args)
+
+    def unbind(self, mode, sym):
+        """Remove the binding of a key in a mode"""
+        self.keymap[mode].pop(sym, None)
+
+    def dispatch(self, event):
+        """Run the action bound to a key press in the current mode and return its result
+
+        Unbound keys and other events are ignored and return None.
+        """
+        if not isinstance(event, tcod.event.KeyDown):
+            return None
+        binding = self.keymap[self.mode].get(event.sym)
+        if binding is None:
+            return None
+        action, *args = binding
+        return self.handlers[self.mode][action](event, *args)
@@ -1,9 +1,15 @@
 # Map generation and management module
+import hashlib
 import numpy as np
 import random
 import tcod
 from tcod import libtcodpy
 import math
+import os
+from core.prefabs import (PREFABS, PATCH_SHAPES, CRYSTAL_SHAPES, PILLAR_SHAPES, SHAPE_TABLES, stamp, stamp_many,
+                          interior_bounds)
+
+from utils.constants import OUTDOOR_TERRAIN, DUNGEON_LAYOUT
 
 # Terrain type constants
 TERRAIN_WALL = 0    # Walls/trees that block movement
@@ -14,9 +20,49 @@ TERRAIN_WATER = 4   # Water that blocks movement
 TERRAIN_SAND = 5    # Walkable sand
 TERRAIN_MOSS = 6    # Mossy ground
 
+# Noise frequencies (per tile) for outdoor terrain
+OUTDOOR_ELEVATION_SCALE = 0.06
+OUTDOOR_MOISTURE_SCALE = 0.1
+
+# Terrain that blocks movement
+BLOCKING_TERRAIN = (TERRAIN_WALL, TERRAIN_WATER, TERRAIN_ROCK)
+
+# Cost of carving through each terrain when connecting regions (walkable tiles cost 1)
+CARVE_COSTS = {TERRAIN_WALL: 4, TERRAIN_ROCK: 6, TERRAIN_WATER: 8}
+MIN_CONNECTED_REGION = 3  # Smaller walkable pockets are filled in instead of connected
+
+CORRIDOR_FEATURE_CHANCE = 0.1  # Chance of a corridor tile being sand or rock instead of grass
+
+# Steps tried, in order, when moving something off a tile such as the stairs
+STEP_OFFSETS = ((0, 1), (1, 0), (0, -1), (-1, 0))
+
+# Per-tile arrays that make up a level's state
+LEVEL_ARRAYS = ('tiles', 'visible', 'explored')
+
+def level_seed(world_seed, level):
+    """Derive the generator seed of one level of a world, independent of every other level"""
+    digest = hashlib.blake2b(f"{world_seed}:{level}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+def generate_world_level(world_seed, level, width, height):
+    """Generate a level of a world from its own seed
+
+    The same level comes out whatever was generated or played before it, and the
+    random module's state is left as it was.
+    """
+    state = random.getstate()
+    random.seed(level_seed(world_seed, level))
+    try:
+        return Map(width, height, level)
+    finally:
+        random.setstate(state)
+
 class Map:
-    def __init__(self, width, height, level):
-        """Initialize a new map with given dimensions and level number"""
+    def __init__(self, width, height, level, generate=True):
+        """Initialize a new map with given dimensions and level number
+
+        Pass generate=False when the level state is about to be restored from a save.
+        """
         self.width = width
         self.height = height
         self.level = level
@@ -31,7 +77,14 @@ class Map:
         self.spawn_point = None  # Player spawn point for outdoor level
         self.save_point = None  # Save point for the level
         self.npcs = []  # List of NPCs in the level
-        self.generate()  # Generate the map
+        self.rooms = []  # Rooms of a generated dungeon level (not saved)
+        self.dirty = True  # Whether anything saved with the level changed since it was last saved
+        self.saved_files = None  # Array files of the last memory-mapped save of the level
+        self.saved_npc_state = None  # NPC state at the last save
+        self.distance_cache = {}  # Distance transforms of the current tiles, see get_distances
+        self.distance_tiles = None  # Tile array the cached distances were computed from
+        if generate:
+            self.generate()  # Generate the map
 
     def generate(self):
         """Generate a map with rooms and corridors"""
@@ -39,9 +92,14 @@ class Map:
             self.generate_outdoor()
         else:
             self.generate_dungeon(self.level)
+        self.invalidate_distances()
+
+    def generate_outdoor(self, terrain=OUTDOOR_TERRAIN):
+        """Generate an outdoor map with natural features
 
-    def generate_outdoor(self):
-        """Generate an outdoor map with natural features"""
+        terrain selects how features are laid out: 'patches' scatters random blobs and
+        'noise' thresholds fractal noise sampled over the whole grid.
+        """
         # Initialize the map with grass
         self.tiles.fill(TERRAIN_GRASS)
         
@@ -56,95 +114,16 @@ class Map:
         cave_y = self.height - 8
         self.stairs_down = (cave_x, cave_y)  # Set the stairs_down position
         
-        # Create a large open area in the center
-        center_x = self.width // 2
-        center_y = self.height // 2
-        open_radius = min(self.width, self.height) // 4
-        
-        for x in range(self.width):
-            for y in range(self.height):
-                # Create a more natural-looking open area
-                distance = math.sqrt((x - center_x) ** 2 + (y - center_y) ** 2)
-                if distance < open_radius:
-                    # Add some variation to the center
-                    if random.random() < 0.8:  # 80% chance to be grass
-                        self.tiles[x, y] = TERRAIN_GRASS
-                    else:
-                        self.tiles[x, y] = TERRAIN_SAND
-        
-        # Create a large water body in the center
-        water_radius = open_radius // 2
-        for x in range(self.width):
-            for y in range(self.height):
-                distance = math.sqrt((x - center_x) ** 2 + (y - center_y) ** 2)
-                if distance < water_radius:
-                    self.tiles[x, y] = TERRAIN_WATER
-        
-        # Add rock formations
-        for _ in range(20):  # Reduced number but larger formations
-            x = random.randint(1, self.width - 2)
-            y = random.randint(1, self.height - 2)
-            rock_size = random.randint(3, 6)  # Larger rock formations
-            
-            # Create more natural-looking rock clusters
-            for dx in range(-rock_size, rock_size + 1):
-                for dy in range(-rock_size, rock_size + 1):
-                    if (0 < x + dx < self.width - 1 and 0 < y + dy < self.height - 1):
-                        # Use a smoother falloff for more natural shapes
-                        if random.random() < 0.7 * (1 - (dx*dx + dy*dy)/(rock_size*rock_size)):
-                            self.tiles[x + dx, y + dy] = TERRAIN_ROCK
-        
-        # Add moss patches in natural clusters
-        for _ in range(15):  # Reduced number but larger patches
-            x = random.randint(1, self.width - 2)
-            y = random.randint(1, self.height - 2)
-            moss_size = random.randint(2, 4)
-            
-            # Create more natural moss clusters
-            for dx in range(-moss_size, moss_size + 1):
-                for dy in range(-moss_size, moss_size + 1):
-                    if (0 < x + dx < self.width - 1 and 0 < y + dy < self.height - 1):
-                        # Higher density in center, fading out
-                        if random.random() < 0.8 * (1 - (dx*dx + dy*dy)/(moss_size*moss_size)):
-                            self.tiles[x + dx, y + dy] = TERRAIN_MOSS
-        
-        # Add sand patches in natural formations
-        for _ in range(10):  # Reduced number but larger patches
-            x = random.randint(1, self.width - 2)
-            y = random.randint(1, self.height - 2)
-            sand_size = random.randint(2, 5)
-            
-            for dx in range(-sand_size, sand_size + 1):
-                for dy in range(-sand_size, sand_size + 1):
-                    if (0 < x + dx < self.width - 1 and 0 < y + dy < self.height - 1 and
-                        dx*dx + dy*dy <= sand_size*sand_size):
-                        # Create more natural sand patterns
-                        if random.random() < 0.6 * (1 - (dx*dx + dy*dy)/(sand_size*sand_size)):
-                            self.tiles[x + dx, y + dy] = TERRAIN_SAND
-        
-        # Add some small water features near the main water body
-        water_center_x = self.width // 2
-        water_center_y = self.height // 2
-        for _ in range(3):  # Add a few small water features
-            angle = random.uniform(0, 2 * 3.14159)  # Random angle
-            distance = random.randint(8, 15)  # Distance from main water
-            x = int(water_center_x + distance * math.cos(angle))
-            y = int(water_center_y + distance * math.sin(angle))
-            
-            if 0 < x < self.width - 1 and 0 < y < self.height - 1:
-                # Create small water features
-                water_size = random.randint(2, 3)
-                for dx in range(-water_size, water_size + 1):
-                    for dy in range(-water_size, water_size + 1):
-                        if (0 < x + dx < self.width - 1 and 0 < y + dy < self.height - 1 and
-                            dx*dx + dy*dy <= water_size*water_size):
-                            if random.random() < 0.7:  # 70% chance to place water
-                                self.tiles[x + dx, y + dy] = TERRAIN_WATER
+        # Lay out the natural features
+        if terrain == 'noise':
+            self.generate_noise_terrain()
+        else:
+            self.scatter_outdoor_patches()
         
         # Mark everything as visible and explored in outdoor level
         self.visible.fill(True)
         self.explored.fill(True)
-        self.stairs_discovered["down"] = True
+        self.discover_stairs("down")
         
         # Create a winding path from spawn to cave
         path_points = []
@@ -197,14 +176,15 @@ class Map:
                             self.tiles[x + dx, y + dy] = TERRAIN_SAND
                             path_tiles.add((x + dx, y + dy))
         
-        # Fill non-path areas with rocks and trees
-        for x in range(self.width):
-            for y in range(self.height):
-                if (x, y) not in path_tiles:
-                    if random.random() < 0.1:  # 10% chance for trees
-                        self.tiles[x, y] = TERRAIN_WALL  # Trees
-                    elif random.random() < 0.05:  # 5% chance for rocks
-                        self.tiles[x, y] = TERRAIN_ROCK  # Rocks
+        # Fill non-path areas with rocks and trees (noise terrain already has its own)
+        if terrain != 'noise':
+            for x in range(self.width):
+                for y in range(self.height):
+                    if (x, y) not in path_tiles:
+                        if random.random() < 0.1:  # 10% chance for trees
+                            self.tiles[x, y] = TERRAIN_WALL  # Trees
+                        elif random.random() < 0.05:  # 5% chance for rocks
+                            self.tiles[x, y] = TERRAIN_ROCK  # Rocks
         
         # Handle save point placement
         if hasattr(self, 'save_point') and self.save_point:
@@ -316,12 +296,7 @@ class Map:
         self.tiles[cave_x, cave_y] = TERRAIN_CAVE
         
         # Add markers around the cave entrance
-        for dx in range(-1, 2):
-            for dy in range(-1, 2):
-                if dx == 0 and dy == 0:
-                    continue
-                if 0 < cave_x + dx < self.width - 1 and 0 < cave_y + dy < self.height - 1:
-                    self.tiles[cave_x + dx, cave_y + dy] = TERRAIN_MOSS
+        stamp(self.tiles, PREFABS['ring'], cave_x, cave_y, TERRAIN_MOSS, interior_bounds(self.tiles))
 
         # Add a merchant near the save point
         from core.npc import create_merchant, create_healer
@@ -341,6 +316,122 @@ class Map:
             healer = create_healer(healer_x, healer_y)
             self.add_npc(healer)
 
+    def scatter_outdoor_patches(self):
+        """Scatter an open area, water, rock, moss and sand patches over the outdoor map"""
+        # Create a large open area in the center
+        center_x = self.width // 2
+        center_y = self.height // 2
+        open_radius = min(self.width, self.height) // 4
+        
+        for x in range(self.width):
+            for y in range(self.height):
+                # Create a more natural-looking open area
+                distance = math.sqrt((x - center_x) ** 2 + (y - center_y) ** 2)
+                if distance < open_radius:
+                    # Add some variation to the center
+                    if random.random() < 0.8:  # 80% chance to be grass
+                        self.tiles[x, y] = TERRAIN_GRASS
+                    else:
+                        self.tiles[x, y] = TERRAIN_SAND
+        
+        # Create a large water body in the center
+        water_radius = open_radius // 2
+        for x in range(self.width):
+            for y in range(self.height):
+                distance = math.sqrt((x - center_x) ** 2 + (y - center_y) ** 2)
+                if distance < water_radius:
+                    self.tiles[x, y] = TERRAIN_WATER
+        
+        # Add rock formations
+        for _ in range(20):  # Reduced number but larger formations
+            x = random.randint(1, self.width - 2)
+            y = random.randint(1, self.height - 2)
+            rock_size = random.randint(3, 6)  # Larger rock formations
+            
+            # Create more natural-looking rock clusters
+            for dx in range(-rock_size, rock_size + 1):
+                for dy in range(-rock_size, rock_size + 1):
+                    if (0 < x + dx < self.width - 1 and 0 < y + dy < self.height - 1):
+                        # Use a smoother falloff for more natural shapes
+                        if random.random() < 0.7 * (1 - (dx*dx + dy*dy)/(rock_size*rock_size)):
+                            self.tiles[x + dx, y + dy] = TERRAIN_ROCK
+        
+        # Add moss patches in natural clusters
+        for _ in range(15):  # Reduced number but larger patches
+            x = random.randint(1, self.width - 2)
+            y = random.randint(1, self.height - 2)
+            moss_size = random.randint(2, 4)
+            
+            # Create more natural moss clusters
+            for dx in range(-moss_size, moss_size + 1):
+                for dy in range(-moss_size, moss_size + 1):
+                    if (0 < x + dx < self.width - 1 and 0 < y + dy < self.height - 1):
+                        # Higher density in center, fading out
+                        if random.random() < 0.8 * (1 - (dx*dx + dy*dy)/(moss_size*moss_size)):
+                            self.tiles[x + dx, y + dy] = TERRAIN_MOSS
+        
+        # Add sand patches in natural formations
+        for _ in range(10):  # Reduced number but larger patches
+            x = random.randint(1, self.width - 2)
+            y = random.randint(1, self.height - 2)
+            sand_size = random.randint(2, 5)
+            
+            for dx in range(-sand_size, sand_size + 1):
+                for dy in range(-sand_size, sand_size + 1):
+                    if (0 < x + dx < self.width - 1 and 0 < y + dy < self.height - 1 and
+                        dx*dx + dy*dy <= sand_size*sand_size):
+                        # Create more natural sand patterns
+                        if random.random() < 0.6 * (1 - (dx*dx + dy*dy)/(sand_size*sand_size)):
+                            self.tiles[x + dx, y + dy] = TERRAIN_SAND
+        
+        # Add some small water features near the main water body
+        water_center_x = self.width // 2
+        water_center_y = self.height // 2
+        for _ in range(3):  # Add a few small water features
+            angle = random.uniform(0, 2 * 3.14159)  # Random angle
+            distance = random.randint(8, 15)  # Distance from main water
+            x = int(water_center_x + distance * math.cos(angle))
+            y = int(water_center_y + distance * math.sin(angle))
+            
+            if 0 < x < self.width - 1 and 0 < y < self.height - 1:
+                # Create small water features
+                water_size = random.randint(2, 3)
+                for dx in range(-water_size, water_size + 1):
+                    for dy in range(-water_size, water_size + 1):
+                        if (0 < x + dx < self.width - 1 and 0 < y + dy < self.height - 1 and
+                            dx*dx + dy*dy <= water_size*water_size):
+                            if random.random() < 0.7:  # 70% chance to place water
+                                self.tiles[x + dx, y + dy] = TERRAIN_WATER
+
+    def generate_noise_terrain(self):
+        """Lay out outdoor terrain bands from fractal noise sampled over the whole grid"""
+        seed = random.getrandbits(32)
+        elevation = self.sample_noise(OUTDOOR_ELEVATION_SCALE, seed)
+        moisture = self.sample_noise(OUTDOOR_MOISTURE_SCALE, seed + 1)
+        
+        # Sink the center of the map into a lake surrounded by open ground
+        center_x = self.width // 2
+        center_y = self.height // 2
+        open_radius = min(self.width, self.height) // 4
+        xs = np.arange(self.width)[:, np.newaxis]
+        ys = np.arange(self.height)[np.newaxis, :]
+        distance = np.sqrt((xs - center_x) ** 2 + (ys - center_y) ** 2)
+        elevation -= np.clip(1 - distance / open_radius, 0, 1)
+        
+        # Threshold into terrain bands, from low to high ground
+        self.tiles[:] = np.select(
+            [elevation < -0.55, elevation < -0.45, elevation > 0.55, elevation > 0.35,
+             moisture > 0.4, moisture < -0.45],
+            [TERRAIN_WATER, TERRAIN_SAND, TERRAIN_ROCK, TERRAIN_WALL,
+             TERRAIN_MOSS, TERRAIN_SAND],
+            TERRAIN_GRASS)
+
+    def sample_noise(self, scale, seed):
+        """Sample fractal simplex noise in [-1, 1] over the map grid"""
+        noise = tcod.noise.Noise(2, algorithm=tcod.noise.Algorithm.SIMPLEX,
+                                 implementation=tcod.noise.Implementation.FBM, octaves=4, seed=seed)
+        return noise[tcod.noise.grid(shape=(self.width, self.height), scale=scale, indexing='ij')]
+
     def path_exists(self, start, end):
         """Check if a path exists between two points using breadth-first search"""
         visited = set()
@@ -358,63 +449,84 @@ class Map:
                     queue.append(((next_x, next_y), path + [(next_x, next_y)]))
         return False
 
-    def create_direct_path(self, start, end):
-        """Create a direct path between two points with clear areas around stairs"""
-        x1, y1 = start
-        x2, y2 = end
-
-        # Store the cave entrance position and type if it's at the end point
-        is_cave_end = (x2, y2) == self.stairs_down
-        if is_cave_end:
-            cave_center = (x2, y2)
-            cave_tiles = []
-            # Store the cave entrance tiles
-            for dx in range(-2, 3):
-                for dy in range(-2, 3):
-                    if 0 <= x2 + dx < self.width and 0 <= y2 + dy < self.height:
-                        if dx*dx + dy*dy <= 4:  # 5x5 cave entrance
-                            cave_tiles.append(((x2 + dx, y2 + dy), self.tiles[x2 + dx, y2 + dy]))
-
-        # Clear a 3-tile radius around both stair positions
-        for dx in range(-3, 4):
-            for dy in range(-3, 4):
-                # Clear around start point
-                if 0 <= x1 + dx < self.width and 0 <= y1 + dy < self.height:
-                    self.tiles[x1 + dx, y1 + dy] = TERRAIN_GRASS
-                # Clear around end point
-                if 0 <= x2 + dx < self.width and 0 <= y2 + dy < self.height:
-                    self.tiles[x2 + dx, y2 + dy] = TERRAIN_GRASS
-
-        # Create L-shaped path
-        if random.random() < 0.5:
-            # Horizontal then vertical
-            for x in range(min(x1, x2), max(x1, x2) + 1):
-                self.tiles[x, y1] = TERRAIN_GRASS
-            for y in range(min(y1, y2), max(y1, y2) + 1):
-                self.tiles[x2, y] = TERRAIN_GRASS
-        else:
-            # Vertical then horizontal
-            for y in range(min(y1, y2), max(y1, y2) + 1):
-                self.tiles[x1, y] = TERRAIN_GRASS
-            for x in range(min(x1, x2), max(x1, x2) + 1):
-                self.tiles[x, y2] = TERRAIN_GRASS
+    def connect_regions(self):
+        """Connect all walkable regions through the cheapest runs of blocked terrain
 
-        # Restore the cave entrance if it was at the end point
-        if is_cave_end:
-            for (x, y), terrain in cave_tiles:
-                self.tiles[x, y] = terrain
+        Regions are labeled once and a single Dijkstra pass runs out of the largest one.
+        Every other region, nearest first, is then joined by carving its cheapest path
+        back; regions crossed by an earlier path are already joined and are skipped.
+        """
+        from core.regions import label_regions
+        labels, sizes = label_regions(self.walkable_mask())
+        if len(sizes) <= 1:
+            return
+        
+        # Fill in pockets too small to be worth a corridor
+        small = np.isin(labels, np.flatnonzero(sizes < MIN_CONNECTED_REGION) + 1)
+        self.tiles[small] = TERRAIN_ROCK
+        labels[small] = 0
+        
+        # Carving cost of every tile; the map edge is never carved
+        cost = np.ones(self.tiles.shape, dtype=np.int32)
+        for terrain, carve_cost in CARVE_COSTS.items():
+            cost[self.tiles == terrain] = carve_cost
+        cost[[0, -1], :] = 0
+        cost[:, [0, -1]] = 0
+        
+        main = np.argmax(sizes) + 1
+        distance = tcod.path.maxarray(self.tiles.shape, dtype=np.int32)
+        distance[labels == main] = 0
+        tcod.path.dijkstra2d(distance, cost, 1, 0)
+        
+        # The closest tile of each other region, ordered by distance
+        region_x, region_y = np.nonzero((labels > 0) & (labels != main))
+        region_labels = labels[region_x, region_y]
+        order = np.lexsort((distance[region_x, region_y], region_labels))
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = region_labels[order][1:] != region_labels[order][:-1]
+        closest = order[first]
+        closest = closest[np.argsort(distance[region_x[closest], region_y[closest]], kind='stable')]
+        
+        joined = {int(main)}
+        for i in closest:
+            if labels[region_x[i], region_y[i]] in joined:
+                continue
+            # Walk back to the main region, carving blocked tiles on the way
+            path = tcod.path.hillclimb2d(distance, (int(region_x[i]), int(region_y[i])), True, False)
+            path_x, path_y = path[:, 0], path[:, 1]
+            carve = cost[path_x, path_y] > 1
+            self.tiles[path_x[carve], path_y[carve]] = TERRAIN_GRASS
+            joined.update(int(label) for label in np.unique(labels[path_x, path_y]) if label)
+        self.invalidate_distances()
 
     def ensure_clear_stair_area(self, x, y):
         """Ensure a 3-tile radius around a position is clear"""
-        for dx in range(-3, 4):
-            for dy in range(-3, 4):
-                if 0 <= x + dx < self.width and 0 <= y + dy < self.height:
-                    self.tiles[x + dx, y + dy] = TERRAIN_GRASS
-
-    def generate_dungeon(self, level):
-        """Generate a dungeon level with rooms, corridors, and features"""
+        stamp(self.tiles, PREFABS['stair_clear'], x, y, TERRAIN_GRASS)
+
+    def scatter_prefabs(self, shapes, count, terrain, rng):
+        """Stamp randomly shaped features of terrain at up to count random grass tiles
+
+        Shapes are one of the shape tuples in SHAPE_TABLES; anchors and shapes are drawn
+        in one batch from the NumPy Generator rng.
+        """
+        xs = rng.integers(1, self.width - 1, size=count)
+        ys = rng.integers(1, self.height - 1, size=count)
+        names = SHAPE_TABLES[shapes].sample(rng, count)
+
+        # Anchors must be on grass before the pass; each shape is stamped in one batch
+        on_grass = self.tiles[xs, ys] == TERRAIN_GRASS
+        for name in np.unique(names[on_grass]):
+            chosen = on_grass & (names == name)
+            stamp_many(self.tiles, PREFABS[name], xs[chosen], ys[chosen], terrain, interior_bounds(self.tiles))
+
+    def generate_dungeon(self, level, layout=DUNGEON_LAYOUT):
+        """Generate a dungeon level with rooms, corridors, and features
+
+        layout selects how rooms are laid out: 'scatter' places randomly sized rooms
+        where they fit and 'bsp' puts one room in each leaf of a binary space partition.
+        """
         # Initialize the map with walls
-        self.tiles = np.full((self.width, self.height), TERRAIN_WALL)
+        self.tiles.fill(TERRAIN_WALL)
         
         if level == 0:  # Starting area
             # Create a single large body of water in the center
@@ -423,57 +535,67 @@ class Map:
             water_radius = 5
             
             # Create the water body
-            for y in range(water_center_y - water_radius, water_center_y + water_radius + 1):
-                for x in range(water_center_x - water_radius, water_center_x + water_radius + 1):
-                    if (x - water_center_x) ** 2 + (y - water_center_y) ** 2 <= water_radius ** 2:
-                        self.tiles[x, y] = TERRAIN_WATER
+            xs = np.arange(self.width)[:, np.newaxis]
+            ys = np.arange(self.height)[np.newaxis, :]
+            water = (xs - water_center_x) ** 2 + (ys - water_center_y) ** 2 <= water_radius ** 2
+            self.tiles[water] = TERRAIN_WATER
             
-            # Create a maze-like pattern using recursive division
-            def divide(x, y, width, height, orientation):
+            # Create a maze-like pattern using recursive division. An explicit stack replaces
+            # recursion; the second half is pushed first so sections are divided (and random
+            # numbers drawn) in the same order as a depth-first recursive division
+            orientation = 'horizontal' if random.random() < 0.5 else 'vertical'
+            stack = [(1, 1, self.width - 2, self.height - 2, orientation)]
+            while stack:
+                x, y, width, height, orientation = stack.pop()
                 if width < 3 or height < 3:
-                    return
+                    continue
                 
                 # Choose a wall position
                 if orientation == 'horizontal':
                     wall_y = y + random.randint(1, height - 2)
                     passage_x = x + random.randint(0, width - 1)
                     
-                    # Create horizontal wall
-                    for wall_x in range(x, x + width):
-                        if wall_x != passage_x:
-                            self.tiles[wall_x, wall_y] = TERRAIN_WALL
+                    # Create horizontal wall, leaving the passage tile untouched
+                    passage = self.tiles[passage_x, wall_y]
+                    self.tiles[x:x + width, wall_y] = TERRAIN_WALL
+                    self.tiles[passage_x, wall_y] = passage
                     
-                    # Recursively divide the two new sections
-                    divide(x, y, width, wall_y - y, 'vertical')
-                    divide(x, wall_y + 1, width, y + height - wall_y - 1, 'vertical')
+                    # Divide the two new sections
+                    stack.append((x, wall_y + 1, width, y + height - wall_y - 1, 'vertical'))
+                    stack.append((x, y, width, wall_y - y, 'vertical'))
                 else:  # vertical
                     wall_x = x + random.randint(1, width - 2)
                     passage_y = y + random.randint(0, height - 1)
                     
-                    # Create vertical wall
-                    for wall_y in range(y, y + height):
-                        if wall_y != passage_y:
-                            self.tiles[wall_x, wall_y] = TERRAIN_WALL
+                    # Create vertical wall, leaving the passage tile untouched
+                    passage = self.tiles[wall_x, passage_y]
+                    self.tiles[wall_x, y:y + height] = TERRAIN_WALL
+                    self.tiles[wall_x, passage_y] = passage
                     
-                    # Recursively divide the two new sections
-                    divide(x, y, wall_x - x, height, 'horizontal')
-                    divide(wall_x + 1, y, x + width - wall_x - 1, height, 'horizontal')
-            
-            # Start the division process
-            divide(1, 1, self.width - 2, self.height - 2, 'horizontal' if random.random() < 0.5 else 'vertical')
+                    # Divide the two new sections
+                    stack.append((wall_x + 1, y, x + width - wall_x - 1, height, 'horizontal'))
+                    stack.append((x, y, wall_x - x, height, 'horizontal'))
             
-            # Convert some walls to grass to create paths
-            for y in range(1, self.height - 1):
-                for x in range(1, self.width - 1):
-                    if self.tiles[x, y] == TERRAIN_WALL:
-                        # Count adjacent walls
-                        wall_count = sum(1 for dx, dy in [(0, 1), (1, 0), (0, -1), (-1, 0)]
-                                      if 0 <= x + dx < self.width and 0 <= y + dy < self.height
-                                      and self.tiles[x + dx, y + dy] == TERRAIN_WALL)
-                        
-                        # If this wall has 3 or 4 adjacent walls, make it grass
-                        if wall_count >= 3:
-                            self.tiles[x, y] = TERRAIN_GRASS
+            # Convert walls with 3 or 4 adjacent walls to grass to create paths. Tiles are
+            # converted in row order and each one sees the conversions of its left and upper
+            # neighbors, so whole anti-diagonals (x + y constant) are processed at once: no two
+            # tiles on one anti-diagonal are adjacent
+            inner_x, inner_y = np.meshgrid(np.arange(1, self.width - 1), np.arange(1, self.height - 1), indexing='ij')
+            diagonal = (inner_x + inner_y).ravel()
+            order = np.argsort(diagonal, kind='stable')
+            bounds = np.searchsorted(diagonal[order], np.arange(diagonal.min(), diagonal.max() + 2))
+            inner_x = inner_x.ravel()[order]
+            inner_y = inner_y.ravel()[order]
+            for start, end in zip(bounds[:-1], bounds[1:]):
+                x = inner_x[start:end]
+                y = inner_y[start:end]
+                is_wall = self.tiles[x, y] == TERRAIN_WALL
+                wall_count = ((self.tiles[x, y + 1] == TERRAIN_WALL).astype(np.int8) +
+                              (self.tiles[x + 1, y] == TERRAIN_WALL) +
+                              (self.tiles[x, y - 1] == TERRAIN_WALL) +
+                              (self.tiles[x - 1, y] == TERRAIN_WALL))
+                convert = is_wall & (wall_count >= 3)
+                self.tiles[x[convert], y[convert]] = TERRAIN_GRASS
             
             # Place the cave entrance at the bottom of the map
             cave_x = self.width // 2
@@ -523,346 +645,90 @@ class Map:
             
             return
         
+        # Deep levels are sometimes natural caves instead of rooms and corridors
+        from core.caves import CAVE_MIN_LEVEL, CAVE_LEVEL_CHANCE
+        if level >= CAVE_MIN_LEVEL and random.random() < CAVE_LEVEL_CHANCE:
+            self.generate_cave(level)
+            return
+        
         # For other levels, use the existing dungeon generation code
-        # Generate multiple rooms
-        num_rooms = random.randint(5, 8)  # Number of rooms to generate
+        from core.rooms import (RoomPlacer, carve_room, make_room, partition_rooms, room_type_table,
+                                ROOM_AREA_PER_SCALE, BSP_DEPTH)
+        
+        # Generate multiple rooms; larger maps get proportionally more placement attempts
+        area_scale = max(1, (self.width * self.height) // ROOM_AREA_PER_SCALE)
+        num_rooms = random.randint(5, 8) * area_scale  # Number of rooms to generate
         rooms = []
         min_room_size = 5
         max_room_size = 12
 
-        # Define room types with their probabilities, adjusted by level
-        base_room_types = {
-            'normal': 0.3,     # Regular room
-            'water': 0.1,      # Water pool room
-            'sand': 0.1,       # Sandy room
-            'rocky': 0.1,      # Rocky room
-            'crystal': 0.1,    # Crystal formation room
-            'mossy': 0.05,    # Mossy room
-            'lava': 0.05,     # Lava room (deeper levels)
-            'fungal': 0.05,   # Fungal growth room
-            'bone': 0.05,     # Bone room
-            'treasure': 0.05,  # Treasure room
-            'ritual': 0.05    # Ritual room
-        }
-
-        # Adjust probabilities based on level
-        level_factor = min(1.0, level / 5.0)  # Increases with depth
-        room_types = base_room_types.copy()
-        
-        # Increase chances of special rooms in deeper levels
-        if level > 3:
-            room_types['lava'] = 0.15
-            room_types['crystal'] = 0.15
-            room_types['ritual'] = 0.1
-        if level > 6:
-            room_types['bone'] = 0.15
-            room_types['fungal'] = 0.15
-            room_types['treasure'] = 0.1
-
-        # Normalize probabilities
-        total = sum(room_types.values())
-        room_types = {k: v/total for k, v in room_types.items()}
-
-        for _ in range(num_rooms):
-            # Try to place a room
-            room_width = random.randint(min_room_size, max_room_size)
-            room_height = random.randint(min_room_size, max_room_size)
-            room_x = random.randint(1, self.width - room_width - 1)
-            room_y = random.randint(1, self.height - room_height - 1)
-
-            # Check if the room overlaps with existing rooms
-            new_room = {
-                'x': room_x,
-                'y': room_y,
-                'width': room_width,
-                'height': room_height,
-                'center_x': room_x + room_width // 2,
-                'center_y': room_y + room_height // 2,
-                'type': random.choices(list(room_types.keys()), list(room_types.values()))[0]
-            }
-
-            # Check for overlap with existing rooms
-            overlap = False
+        # Room types with their probabilities, adjusted by level
+        room_table = room_type_table(level)
+
+        # Room types, sizes and decoration are drawn in batches from a generator seeded
+        # from the game's random state
+        rng = np.random.default_rng(random.getrandbits(32))
+        if layout == 'bsp':
+            # One room per leaf of a binary space partition: a fixed amount of work per room
+            depth = BSP_DEPTH + area_scale.bit_length() - 1
+            rooms = partition_rooms(self.width, self.height, depth, min_room_size, max_room_size, room_table, rng)
             for room in rooms:
-                if (new_room['x'] < room['x'] + room['width'] + 2 and
-                    new_room['x'] + new_room['width'] + 2 > room['x'] and
-                    new_room['y'] < room['y'] + room['height'] + 2 and
-                    new_room['y'] + new_room['height'] + 2 > room['y']):
-                    overlap = True
-                    break
-
-            if not overlap:
-                # Create the room with its specific terrain type
-                for x in range(room_x, room_x + room_width):
-                    for y in range(room_y, room_y + room_height):
-                        if new_room['type'] == 'normal':
-                            self.tiles[x, y] = TERRAIN_GRASS
-                        elif new_room['type'] == 'water':
-                            # Create a water pool with some walkable edges
-                            if (x == room_x or x == room_x + room_width - 1 or
-                                y == room_y or y == room_y + room_height - 1):
-                                self.tiles[x, y] = TERRAIN_GRASS
-                            else:
-                                self.tiles[x, y] = TERRAIN_WATER
-                        elif new_room['type'] == 'sand':
-                            self.tiles[x, y] = TERRAIN_SAND
-                        elif new_room['type'] == 'rocky':
-                            # Create a rocky room with scattered rocks
-                            if random.random() < 0.2:  # 20% chance for rocks
-                                self.tiles[x, y] = TERRAIN_ROCK
-                            else:
-                                self.tiles[x, y] = TERRAIN_GRASS
-                        elif new_room['type'] == 'crystal':
-                            # Create a crystal formation room
-                            if random.random() < 0.3:  # 30% chance for crystal formations
-                                self.tiles[x, y] = TERRAIN_ROCK
-                            else:
-                                self.tiles[x, y] = TERRAIN_GRASS
-                        elif new_room['type'] == 'mossy':
-                            # Create a mossy room with scattered rocks and grass
-                            if random.random() < 0.15:  # 15% chance for rocks
-                                self.tiles[x, y] = TERRAIN_ROCK
-                            else:
-                                self.tiles[x, y] = TERRAIN_GRASS
-                        elif new_room['type'] == 'lava':
-                            # Create a lava room (represented as water for now)
-                            if (x == room_x or x == room_x + room_width - 1 or
-                                y == room_y or y == room_y + room_height - 1):
-                                self.tiles[x, y] = TERRAIN_GRASS
-                            else:
-                                self.tiles[x, y] = TERRAIN_WATER
-                        elif new_room['type'] == 'fungal':
-                            # Create a fungal growth room
-                            if random.random() < 0.4:  # 40% chance for fungal growth
-                                self.tiles[x, y] = TERRAIN_ROCK
-                            else:
-                                self.tiles[x, y] = TERRAIN_GRASS
-                        elif new_room['type'] == 'bone':
-                            # Create a bone room
-                            if random.random() < 0.25:  # 25% chance for bones
-                                self.tiles[x, y] = TERRAIN_ROCK
-                            else:
-                                self.tiles[x, y] = TERRAIN_SAND
-                        elif new_room['type'] == 'treasure':
-                            # Create a treasure room with scattered rocks
-                            if random.random() < 0.1:  # 10% chance for rocks
-                                self.tiles[x, y] = TERRAIN_ROCK
-                            else:
-                                self.tiles[x, y] = TERRAIN_GRASS
-                        elif new_room['type'] == 'ritual':
-                            # Create a ritual room with a special pattern
-                            if (x - room_x) % 3 == 0 and (y - room_y) % 3 == 0:
-                                self.tiles[x, y] = TERRAIN_ROCK
-                            else:
-                                self.tiles[x, y] = TERRAIN_GRASS
-                rooms.append(new_room)
-
-        # Connect rooms with corridors
-        for i in range(len(rooms) - 1):
-            # Get centers of current and next room
-            current = rooms[i]
-            next_room = rooms[i + 1]
-
-            # Create L-shaped corridor with some variation
-            if random.random() < 0.5:
-                # Horizontal then vertical
-                for x in range(min(current['center_x'], next_room['center_x']),
-                             max(current['center_x'], next_room['center_x']) + 1):
-                    self.tiles[x, current['center_y']] = TERRAIN_GRASS
-                    # Add some random terrain features in corridors
-                    if random.random() < 0.1:  # 10% chance for features
-                        if random.random() < 0.5:
-                            self.tiles[x, current['center_y']] = TERRAIN_SAND
-                        else:
-                            self.tiles[x, current['center_y']] = TERRAIN_ROCK
-                for y in range(min(current['center_y'], next_room['center_y']),
-                             max(current['center_y'], next_room['center_y']) + 1):
-                    self.tiles[next_room['center_x'], y] = TERRAIN_GRASS
-                    # Add some random terrain features in corridors
-                    if random.random() < 0.1:  # 10% chance for features
-                        if random.random() < 0.5:
-                            self.tiles[next_room['center_x'], y] = TERRAIN_SAND
-                        else:
-                            self.tiles[next_room['center_x'], y] = TERRAIN_ROCK
+                carve_room(self.tiles, room, rng)
+        else:
+            # Draw every candidate room at once
+            widths = rng.integers(min_room_size, max_room_size + 1, size=num_rooms)
+            heights = rng.integers(min_room_size, max_room_size + 1, size=num_rooms)
+            xs = rng.integers(1, self.width - widths)
+            ys = rng.integers(1, self.height - heights)
+            types = room_table.sample(rng, num_rooms)
+
+            # Reserved room footprints make each overlap test a single bitmap lookup
+            placer = RoomPlacer(self.width, self.height)
+            for i in range(num_rooms):
+                # Try to place a room
+                new_room = make_room(int(xs[i]), int(ys[i]), int(widths[i]), int(heights[i]), types[i])
+
+                # Check for overlap with existing rooms
+                if placer.fits(new_room):
+                    # Create the room with its specific terrain type
+                    placer.place(new_room)
+                    carve_room(self.tiles, new_room, rng)
+                    rooms.append(new_room)
+
+        self.rooms = rooms
+
+        # Connect consecutive rooms with L-shaped corridors, horizontal or vertical leg first
+        horizontal_first = rng.random(max(0, len(rooms) - 1)) < 0.5
+        for current, next_room, horizontal in zip(rooms, rooms[1:], horizontal_first):
+            xs = np.arange(min(current['center_x'], next_room['center_x']),
+                           max(current['center_x'], next_room['center_x']) + 1)
+            ys = np.arange(min(current['center_y'], next_room['center_y']),
+                           max(current['center_y'], next_room['center_y']) + 1)
+            if horizontal:
+                self.carve_corridor(xs, np.full_like(xs, current['center_y']), rng)
+                self.carve_corridor(np.full_like(ys, next_room['center_x']), ys, rng)
             else:
-                # Vertical then horizontal
-                for y in range(min(current['center_y'], next_room['center_y']),
-                             max(current['center_y'], next_room['center_y']) + 1):
-                    self.tiles[current['center_x'], y] = TERRAIN_GRASS
-                    # Add some random terrain features in corridors
-                    if random.random() < 0.1:  # 10% chance for features
-                        if random.random() < 0.5:
-                            self.tiles[current['center_x'], y] = TERRAIN_SAND
-                        else:
-                            self.tiles[current['center_x'], y] = TERRAIN_ROCK
-                for x in range(min(current['center_x'], next_room['center_x']),
-                             max(current['center_x'], next_room['center_x']) + 1):
-                    self.tiles[x, next_room['center_y']] = TERRAIN_GRASS
-                    # Add some random terrain features in corridors
-                    if random.random() < 0.1:  # 10% chance for features
-                        if random.random() < 0.5:
-                            self.tiles[x, next_room['center_y']] = TERRAIN_SAND
-                        else:
-                            self.tiles[x, next_room['center_y']] = TERRAIN_ROCK
+                self.carve_corridor(np.full_like(ys, current['center_x']), ys, rng)
+                self.carve_corridor(xs, np.full_like(xs, next_room['center_y']), rng)
 
         # Add some random pillars and decorations
-        for _ in range(random.randint(3, 6)):
-            x = random.randint(1, self.width - 2)
-            y = random.randint(1, self.height - 2)
-            if self.tiles[x, y] == TERRAIN_GRASS:
-                self.tiles[x, y] = TERRAIN_ROCK
+        self.scatter_prefabs(PILLAR_SHAPES, rng.integers(3, 7), TERRAIN_ROCK, rng)
 
-        # Add some small water pools in corridors
-        for _ in range(random.randint(2, 4)):
-            x = random.randint(1, self.width - 2)
-            y = random.randint(1, self.height - 2)
-            if self.tiles[x, y] == TERRAIN_GRASS:
-                # Create a small water pool with varying shapes
-                pool_shape = random.choice(['square', 'cross', 'plus', 'diamond', 'zigzag'])
-                if pool_shape == 'square':
-                    # 2x2 water pool
-                    for dx in range(2):
-                        for dy in range(2):
-                            if 0 < x + dx < self.width - 1 and 0 < y + dy < self.height - 1:
-                                self.tiles[x + dx, y + dy] = TERRAIN_WATER
-                elif pool_shape == 'cross':
-                    # Cross-shaped water pool
-                    for dx, dy in [(0, 0), (1, 0), (-1, 0), (0, 1), (0, -1)]:
-                        if 0 < x + dx < self.width - 1 and 0 < y + dy < self.height - 1:
-                            self.tiles[x + dx, y + dy] = TERRAIN_WATER
-                elif pool_shape == 'plus':
-                    # Plus-shaped water pool
-                    for dx, dy in [(0, 0), (1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (-1, -1), (1, -1), (-1, 1)]:
-                        if 0 < x + dx < self.width - 1 and 0 < y + dy < self.height - 1:
-                            self.tiles[x + dx, y + dy] = TERRAIN_WATER
-                elif pool_shape == 'diamond':
-                    # Diamond-shaped water pool
-                    for dx, dy in [(0, 0), (1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (-1, -1)]:
-                        if 0 < x + dx < self.width - 1 and 0 < y + dy < self.height - 1:
-                            self.tiles[x + dx, y + dy] = TERRAIN_WATER
-                else:  # zigzag
-                    # Zigzag water pool
-                    for i in range(3):
-                        if 0 < x + i < self.width - 1:
-                            self.tiles[x + i, y + (i % 2)] = TERRAIN_WATER
-
-        # Add some sand patches in corridors
-        for _ in range(random.randint(2, 4)):
-            x = random.randint(1, self.width - 2)
-            y = random.randint(1, self.height - 2)
-            if self.tiles[x, y] == TERRAIN_GRASS:
-                # Create a small sand patch with varying shapes
-                patch_shape = random.choice(['square', 'cross', 'plus', 'diamond', 'zigzag'])
-                if patch_shape == 'square':
-                    # 2x2 sand patch
-                    for dx in range(2):
-                        for dy in range(2):
-                            if 0 < x + dx < self.width - 1 and 0 < y + dy < self.height - 1:
-                                self.tiles[x + dx, y + dy] = TERRAIN_SAND
-                elif patch_shape == 'cross':
-                    # Cross-shaped sand patch
-                    for dx, dy in [(0, 0), (1, 0), (-1, 0), (0, 1), (0, -1)]:
-                        if 0 < x + dx < self.width - 1 and 0 < y + dy < self.height - 1:
-                            self.tiles[x + dx, y + dy] = TERRAIN_SAND
-                elif patch_shape == 'plus':
-                    # Plus-shaped sand patch
-                    for dx, dy in [(0, 0), (1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (-1, -1), (1, -1), (-1, 1)]:
-                        if 0 < x + dx < self.width - 1 and 0 < y + dy < self.height - 1:
-                            self.tiles[x + dx, y + dy] = TERRAIN_SAND
-                elif patch_shape == 'diamond':
-                    # Diamond-shaped sand patch
-                    for dx, dy in [(0, 0), (1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (-1, -1)]:
-                        if 0 < x + dx < self.width - 1 and 0 < y + dy < self.height - 1:
-                            self.tiles[x + dx, y + dy] = TERRAIN_SAND
-                else:  # zigzag
-                    # Zigzag sand patch
-                    for i in range(3):
-                        if 0 < x + i < self.width - 1:
-                            self.tiles[x + i, y + (i % 2)] = TERRAIN_SAND
-
-        # Add some crystal formations
-        for _ in range(random.randint(2, 4)):
-            x = random.randint(1, self.width - 2)
-            y = random.randint(1, self.height - 2)
-            if self.tiles[x, y] == TERRAIN_GRASS:
-                # Create a crystal formation with varying shapes
-                crystal_shape = random.choice(['single', 'cluster', 'line', 'spiral', 'star'])
-                if crystal_shape == 'single':
-                    self.tiles[x, y] = TERRAIN_ROCK
-                elif crystal_shape == 'cluster':
-                    for dx, dy in [(0, 0), (1, 0), (-1, 0), (0, 1), (0, -1)]:
-                        if 0 < x + dx < self.width - 1 and 0 < y + dy < self.height - 1:
-                            self.tiles[x + dx, y + dy] = TERRAIN_ROCK
-                elif crystal_shape == 'line':
-                    direction = random.choice(['horizontal', 'vertical'])
-                    length = random.randint(2, 4)
-                    for i in range(length):
-                        if direction == 'horizontal':
-                            if 0 < x + i < self.width - 1:
-                                self.tiles[x + i, y] = TERRAIN_ROCK
-                        else:
-                            if 0 < y + i < self.height - 1:
-                                self.tiles[x, y + i] = TERRAIN_ROCK
-                elif crystal_shape == 'spiral':
-                    # Create a spiral pattern
-                    for i in range(4):
-                        for j in range(i + 1):
-                            if 0 < x + j < self.width - 1 and 0 < y + i < self.height - 1:
-                                self.tiles[x + j, y + i] = TERRAIN_ROCK
-                else:  # star
-                    # Create a star pattern
-                    for dx, dy in [(0, 0), (1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (-1, -1), (1, -1), (-1, 1)]:
-                        if 0 < x + dx < self.width - 1 and 0 < y + dy < self.height - 1:
-                            self.tiles[x + dx, y + dy] = TERRAIN_ROCK
+        # Add some small water pools and sand patches in corridors, and crystal formations
+        self.scatter_prefabs(PATCH_SHAPES, rng.integers(2, 5), TERRAIN_WATER, rng)
+        self.scatter_prefabs(PATCH_SHAPES, rng.integers(2, 5), TERRAIN_SAND, rng)
+        self.scatter_prefabs(CRYSTAL_SHAPES, rng.integers(2, 5), TERRAIN_ROCK, rng)
 
         # Place stairs based on level
-        if level > 0:  # Not the first level
+        if level > 0 and rooms:  # Not the first level
             # Place up stairs in the first room
-            if rooms:
-                room = rooms[0]
-                # Find a walkable spot in the room
-                for dx in range(-1, 2):
-                    for dy in range(-1, 2):
-                        x, y = room['center_x'] + dx, room['center_y'] + dy
-                        if self.is_walkable(x, y):
-                            self.stairs_up = (x, y)
-                            # Ensure clear area around stairs
-                            self.ensure_clear_stair_area(x, y)
-                            # Add special features around stairs (outside the clear area)
-                            for sx, sy in [(0, 4), (4, 0), (0, -4), (-4, 0)]:
-                                if 0 < x + sx < self.width - 1 and 0 < y + sy < self.height - 1:
-                                    if random.random() < 0.3:  # 30% chance for decorative features
-                                        self.tiles[x + sx, y + sy] = TERRAIN_ROCK
-                            break
-                    if self.stairs_up:
-                        break
-        
-        if level < 9:  # Not the last level
+            self.stairs_up = self.place_stairs(rooms[0], rng)
+        if level < 9 and rooms:  # Not the last level
             # Place down stairs in the last room
-            if rooms:
-                room = rooms[-1]
-                # Find a walkable spot in the room
-                for dx in range(-1, 2):
-                    for dy in range(-1, 2):
-                        x, y = room['center_x'] + dx, room['center_y'] + dy
-                        if self.is_walkable(x, y):
-                            self.stairs_down = (x, y)
-                            # Ensure clear area around stairs
-                            self.ensure_clear_stair_area(x, y)
-                            # Add special features around stairs (outside the clear area)
-                            for sx, sy in [(0, 4), (4, 0), (0, -4), (-4, 0)]:
-                                if 0 < x + sx < self.width - 1 and 0 < y + sy < self.height - 1:
-                                    if random.random() < 0.3:  # 30% chance for decorative features
-                                        self.tiles[x + sx, y + sy] = TERRAIN_ROCK
-                            break
-                    if self.stairs_down:
-                        break
-
-        # Ensure there's a path between stairs
-        if self.stairs_up and self.stairs_down:
-            if not self.path_exists(self.stairs_up, self.stairs_down):
-                # Create a direct path between stairs
-                self.create_direct_path(self.stairs_up, self.stairs_down)
+            self.stairs_down = self.place_stairs(rooms[-1], rng)
+
+        # Ensure every part of the level, stairs included, can be reached
+        self.connect_regions()
 
         # Add NPCs based on level
         if level == 1:
@@ -871,27 +737,121 @@ class Map:
                 room = rooms[0]
                 guide_x = room['center_x']
                 guide_y = room['center_y']
+                if (guide_x, guide_y) == self.stairs_up:
+                    # Keep the stairs free; the guide waits beside them instead
+                    guide_x, guide_y = self.step_away_from(guide_x, guide_y)
                 if self.is_walkable(guide_x, guide_y):
                     from core.npc import create_guide
                     guide = create_guide(guide_x, guide_y)
                     self.add_npc(guide)
 
+    def carve_corridor(self, xs, ys, rng):
+        """Carve a corridor through the given tiles, turning some of them into sand or rock"""
+        feature = rng.random(len(xs)) < CORRIDOR_FEATURE_CHANCE
+        sand = rng.random(len(xs)) < 0.5
+        self.tiles[xs, ys] = np.where(feature, np.where(sand, TERRAIN_SAND, TERRAIN_ROCK), TERRAIN_GRASS)
+
+    def place_stairs(self, room, rng):
+        """Place stairs near the center of a room and return their position"""
+        # Use the tile farthest from any wall in the 3x3 block around the center, or the
+        # center itself if corridor features block the whole block (it is cleared below)
+        left, top = room['center_x'] - 1, room['center_y'] - 1
+        openness = self.distance_to_wall()[left:left + 3, top:top + 3]
+        x, y = room['center_x'], room['center_y']
+        if openness.any():
+            dx, dy = np.unravel_index(np.argmax(openness), openness.shape)
+            x, y = left + int(dx), top + int(dy)
+        
+        # Ensure clear area around stairs
+        self.ensure_clear_stair_area(x, y)
+        # Add special features around stairs (outside the clear area), 30% chance each
+        stamp(self.tiles, PREFABS['markers'], x, y, TERRAIN_ROCK, interior_bounds(self.tiles), density=0.3, rng=rng)
+        self.invalidate_distances()
+        return (x, y)
+
+    def generate_cave(self, level):
+        """Generate a cave level with the stairs at opposite ends of its single region"""
+        from core.caves import cave_walls, wall_counts
+        rng = np.random.default_rng(random.getrandbits(32))
+        walls = cave_walls(self.width, self.height, rng)
+        floor = ~walls
+        self.tiles[:] = np.where(walls, TERRAIN_WALL, TERRAIN_GRASS)
+        
+        # Sand collects along the cave walls
+        self.tiles[floor & (wall_counts(walls) >= 4)] = TERRAIN_SAND
+        
+        # Put the up stairs on a random floor tile
+        floor_x, floor_y = np.nonzero(floor)
+        i = rng.integers(len(floor_x))
+        self.stairs_up = (int(floor_x[i]), int(floor_y[i]))
+        
+        if level < 9:  # Not the last level
+            # Put the down stairs on the floor tile farthest to walk from the up stairs
+            distance = tcod.path.maxarray(floor.shape, dtype=np.int32)
+            distance[self.stairs_up] = 0
+            tcod.path.dijkstra2d(distance, floor.astype(np.int32), 1, 0)
+            distance[walls] = -1
+            down_x, down_y = np.unravel_index(np.argmax(distance), distance.shape)
+            self.stairs_down = (int(down_x), int(down_y))
+
+    def storage_files(self, save_id):
+        """Get the .npy file names the level arrays are written to by the save save_id"""
+        return {name: f"level_{self.level}_{name}_{save_id}.npy" for name in LEVEL_ARRAYS}
+
+    def open_storage(self, directory, files=None):
+        """Map the level arrays copy-on-write from the .npy files of a save
+
+        Pages are read from disk when touched, and changes stay in memory until they
+        are saved to new files. files maps array names to file names; saves written
+        before per-save files used level_<level>_<name>.npy.
+        """
+        for name in LEVEL_ARRAYS:
+            filename = files[name] if files else f"level_{self.level}_{name}.npy"
+            setattr(self, name, np.lib.format.open_memmap(os.path.join(directory, filename), mode='c'))
+        self.saved_files = files
+
+    def set_tile(self, x, y, terrain):
+        """Change a tile after generation and mark the level as changed"""
+        self.tiles[x, y] = terrain
+        self.dirty = True
+        self.invalidate_distances()
+
+    def get_npc_state(self):
+        """Get the persistent state of every NPC in the level"""
+        from core.npc import get_npc_state
+        return [get_npc_state(npc) for npc in self.npcs]
+
+    def has_unsaved_changes(self):
+        """Check if the level changed since mark_saved was last called"""
+        return self.dirty or self.get_npc_state() != self.saved_npc_state
+
+    def mark_saved(self):
+        """Record that the current level state has been saved"""
+        self.dirty = False
+        self.saved_npc_state = self.get_npc_state()
+
+    def discover_stairs(self, direction):
+        """Mark the "up" or "down" stairs as discovered, and the level as changed if they weren't"""
+        if not self.stairs_discovered[direction]:
+            self.stairs_discovered[direction] = True
+            self.dirty = True
+
     def is_stairs(self, x, y):
         """Check if a position contains stairs and mark them as discovered"""
         if self.stairs_up and (x, y) == self.stairs_up:
-            self.stairs_discovered["up"] = True
+            self.discover_stairs("up")
             return "up"
         if self.stairs_down and (x, y) == self.stairs_down:
-            self.stairs_discovered["down"] = True
+            self.discover_stairs("down")
             return "down"
         return None
 
     def check_stairs_discovery(self):
         """Check if stairs are in the current field of view and mark them as discovered"""
         if self.stairs_up and self.visible[self.stairs_up]:
-            self.stairs_discovered["up"] = True
+            self.discover_stairs("up")
         if self.stairs_down and self.visible[self.stairs_down]:
-            self.stairs_discovered["down"] = True
+            self.discover_stairs("down")
 
     def is_walkable(self, x, y):
         """Check if a position is walkable"""
@@ -906,6 +866,83 @@ class Map:
         else:
             return self.tiles[x, y] not in [TERRAIN_WALL, TERRAIN_WATER, TERRAIN_ROCK]
 
+    def walkable_mask(self):
+        """Get a boolean array of tiles whose terrain can be walked on (ignoring NPCs)"""
+        return ~np.isin(self.tiles, BLOCKING_TERRAIN)
+
+    def invalidate_distances(self):
+        """Drop cached distance transforms after the tiles changed in place"""
+        self.distance_cache = {}
+
+    def get_distances(self, key, compute):
+        """Get a cached distance transform, computing it with compute() if needed"""
+        if self.distance_tiles is not self.tiles:
+            # The tile array was replaced, e.g. by loading a save
+            self.distance_cache = {}
+            self.distance_tiles = self.tiles
+        if key not in self.distance_cache:
+            self.distance_cache[key] = compute()
+        return self.distance_cache[key]
+
+    def distance_from(self, origin):
+        """Get the walking distance (in steps) from origin to every tile, -1 where unreachable"""
+        def compute():
+            walkable = self.walkable_mask()
+            distance = tcod.path.maxarray(walkable.shape, dtype=np.int32)
+            distance[origin] = 0
+            tcod.path.dijkstra2d(distance, walkable.astype(np.int32), 1, 0)
+            distance[distance == np.iinfo(np.int32).max] = -1
+            return distance
+        return self.get_distances(('from', tuple(origin)), compute)
+
+    def distance_to_wall(self):
+        """Get the distance (in king moves) from every tile to the nearest blocked tile or the map edge"""
+        def compute():
+            walkable = np.pad(self.walkable_mask(), 1, constant_values=False)
+            distance = np.where(walkable, np.iinfo(np.int32).max, 0).astype(np.int32)
+            tcod.path.dijkstra2d(distance, np.ones(distance.shape, dtype=np.int32), 1, 1)
+            return distance[1:-1, 1:-1]
+        return self.get_distances('wall', compute)
+
+    def distance_from_spawn(self):
+        """Get the walking distance from the spawn point, or None without one"""
+        return self.distance_from(self.spawn_point) if self.spawn_point else None
+
+    def distance_from_stairs(self, direction):
+        """Get the walking distance from the "up" or "down" stairs, or None without them"""
+        stairs = self.stairs_up if direction == "up" else self.stairs_down
+        return self.distance_from(stairs) if stairs else None
+
+    def npc_mask(self):
+        """Get a boolean array of tiles occupied by NPCs"""
+        mask = np.zeros((self.width, self.height), dtype=bool)
+        for npc in self.npcs:
+            mask[npc.x, npc.y] = True
+        return mask
+
+    def nearest_walkable(self, x, y, max_distance=None):
+        """Get the walkable tile closest to (x, y) in a straight line, or None
+
+        Only tiles within max_distance tiles on each axis are considered if it is given.
+        """
+        candidates = self.walkable_mask() & ~self.npc_mask()
+        if max_distance is not None:
+            window = np.zeros_like(candidates)
+            window[max(0, x - max_distance):x + max_distance + 1, max(0, y - max_distance):y + max_distance + 1] = True
+            candidates &= window
+        xs, ys = np.nonzero(candidates)
+        if not len(xs):
+            return None
+        i = np.argmin((xs - x) ** 2 + (ys - y) ** 2)
+        return int(xs[i]), int(ys[i])
+
+    def step_away_from(self, x, y):
+        """Get a free tile one orthogonal step from (x, y), or (x, y) itself if there is none"""
+        for dx, dy in STEP_OFFSETS:
+            if self.is_walkable(x + dx, y + dy):
+                return x + dx, y + dy
+        return x, y
+
     def update_fov(self, player_x, player_y):
         """Update the field of view based on player position"""
         if self.is_outdoor:
@@ -914,11 +951,10 @@ class Map:
         # Create a new FOV map
         fov_map = tcod.map.Map(self.width, self.height)
         
-        # Set the walls in the FOV map
-        for x in range(self.width):
-            for y in range(self.height):
-                fov_map.transparent[y, x] = self.is_walkable(x, y)
-                fov_map.walkable[y, x] = self.is_walkable(x, y)
+        # Only walkable tiles without NPCs are see-through (transpose to tcod's [y, x] order)
+        walkable = (self.walkable_mask() & ~self.npc_mask()).T
+        fov_map.transparent[:] = walkable
+        fov_map.walkable[:] = walkable
         
         # Compute the FOV
         fov_map.compute_fov(
@@ -930,7 +966,10 @@ class Map:
         )
         
         # Update the visible tiles (transpose to match our coordinate system)
-        self.visible = fov_map.fov.T
+        visible = fov_map.fov.T
+        if not self.dirty and (visible != self.visible).any():
+            self.dirty = True  # Visibility changed, and exploration grows only with it
+        self.visible[:] = visible
         self.explored |= self.visible  # Mark visible tiles as explored
         self.check_stairs_discovery()  # Check for discovered stairs 
 
@@ -143,8 +143,7 @@ def create_healer(x: int, y: int) -> NPC:
         # Get the current game instance instead of creating a new one
         game = Game.get_instance()
         game.player.add_to_inventory(HealthPotion())
-        game.message = "Received a health potion!"
-        game.message_timer = 60
+        game.show_message("Received a health potion!")
         # Debug print
         print("\n=== Inventory Contents ===")
         for i, item in enumerate(game.player.inventory):
@@ -186,4 +185,19 @@ def get_dialogue_for_npc(npc):
     """Get the appropriate dialogue based on NPC state"""
     if npc.name == "Healer" and npc.has_given_potion:
         return "no_potion"
-    return "greeting" 
\ No newline at end of file
+    return "greeting" 
+
+def get_npc_state(npc):
+    """Get the persistent state of an NPC as a dict"""
+    return {'name': npc.name, 'x': npc.x, 'y': npc.y, 'has_given_potion': npc.has_given_potion}
+
+def restore_npc(state):
+    """Recreate an NPC from the state returned by get_npc_state"""
+    factories = {
+        "Merchant": create_merchant,
+        "Guide": create_guide,
+        "Healer": create_healer
+    }
+    npc = factories[state['name']](state['x'], state['y'])
+    npc.has_given_potion = state.get('has_given_potion', False)
+    return npc
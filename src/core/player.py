@@ -1,5 +1,6 @@
 from core.entity import Entity
 from core.status_effect import StatusEffect, EffectType
+from core.stats import StatEngine, TrackedDict, derived_stat
 from utils.colors import COLOR_PLAYER
 from enum import Enum
 import random
@@ -18,7 +19,45 @@ class Skill(Enum):
     SPELLCASTING = "Spellcasting"
     HEALING = "Healing"
 
+# Damage multipliers applied after damage reduction, by damage type
+DAMAGE_TYPE_MULTIPLIERS = {
+    "poison": 0.8,    # Poison deals 80% damage
+    "fire": 1.2,      # Fire deals 120% damage
+    "bleeding": 0.9   # Bleeding deals 90% damage
+}
+
+# Damage multiplier of critical hits, which land with the player's critical_chance
+CRITICAL_HIT_MULTIPLIER = 2.0
+
+# Equipment slots used as stat engine inputs
+EQUIPMENT_WEAPON = "weapon"
+EQUIPMENT_ARMOR = "armor"
+
+# Derived stats with the method that computes them and the inputs they depend on
+STAT_DEPENDENCIES = {
+    'max_hp': ('calculate_max_hp', (Attribute.VITALITY,)),
+    'base_hp_regen': ('calculate_hp_regen', (Attribute.VITALITY,)),
+    'max_stamina': ('calculate_max_stamina', (Attribute.DEXTERITY,)),
+    'stamina_regen': ('calculate_stamina_regen', (Attribute.DEXTERITY,)),
+    'defense': ('calculate_defense', (Attribute.VITALITY, Skill.SHIELD_BLOCK, EQUIPMENT_ARMOR)),
+    'damage_reduction': ('calculate_damage_reduction', ('defense',)),
+    'attack_power': ('calculate_attack_power', (Attribute.STRENGTH, Skill.SWORD_MASTERY, EQUIPMENT_WEAPON)),
+    'critical_chance': ('calculate_critical_chance', (Attribute.DEXTERITY,)),
+    'dodge_chance': ('calculate_dodge_chance', (Attribute.DEXTERITY, Skill.EVASION)),
+}
+
 class Player(Entity):
+    # Derived stats are cached by the stat engine until one of their inputs changes
+    max_hp = derived_stat('max_hp')
+    base_hp_regen = derived_stat('base_hp_regen')
+    max_stamina = derived_stat('max_stamina')
+    stamina_regen = derived_stat('stamina_regen')
+    defense = derived_stat('defense')
+    damage_reduction = derived_stat('damage_reduction')
+    attack_power = derived_stat('attack_power')
+    critical_chance = derived_stat('critical_chance')
+    dodge_chance = derived_stat('dodge_chance')
+
     def __init__(self, x, y):
         """Initialize a new player"""
         super().__init__(
@@ -27,6 +66,11 @@ class Player(Entity):
             char="@",
             color=COLOR_PLAYER
         )
+        # Stat engine for derived stats
+        self.stats = StatEngine(self, STAT_DEPENDENCIES)
+        self._equipped_weapon = None
+        self._equipped_armor = None
+
         # Core attributes
         self.attributes = {
             Attribute.STRENGTH: 10,
@@ -45,25 +89,14 @@ class Player(Entity):
             Skill.HEALING: 1
         }
         
-        # Health attributes (now based on VITALITY)
-        self.max_hp = self.calculate_max_hp()
+        # Health attributes (max HP and regen derived from VITALITY)
         self.hp = self.max_hp
-        self.base_hp_regen = self.calculate_hp_regen()
         self.hp_regen_cooldown = 0
         
-        # Stamina attributes (based on DEXTERITY)
-        self.max_stamina = self.calculate_max_stamina()
+        # Stamina attributes (max stamina and regen derived from DEXTERITY)
         self.stamina = self.max_stamina
-        self.stamina_regen = self.calculate_stamina_regen()
         self.stamina_regen_cooldown = 0
         
-        # Combat attributes (now based on attributes)
-        self.defense = self.calculate_defense()
-        self.damage_reduction = self.calculate_damage_reduction()
-        self.attack_power = self.calculate_attack_power()
-        self.critical_chance = self.calculate_critical_chance()
-        self.dodge_chance = self.calculate_dodge_chance()
-        
         # Status effects
         self.status_effects = []
         self.is_stunned = False
@@ -80,10 +113,6 @@ class Player(Entity):
         self.max_inventory_size = 10
         self.selected_item_index = 0
 
-        # Equipment
-        self.equipped_weapon = None
-        self.equipped_armor = None
-        
         # Combat state
         self.is_attacking = False
         self.attack_cooldown = 0
@@ -120,36 +149,89 @@ class Player(Entity):
         self.last_save_point = None
         self.last_save_level = None
 
+    @property
+    def attributes(self):
+        return self._attributes
+
+    @attributes.setter
+    def attributes(self, values):
+        self._attributes = TrackedDict(values, self.stats.invalidate)
+        self.stats.invalidate_all()
+
+    @property
+    def skills(self):
+        return self._skills
+
+    @skills.setter
+    def skills(self, values):
+        self._skills = TrackedDict(values, self.stats.invalidate)
+        self.stats.invalidate_all()
+
+    @property
+    def equipped_weapon(self):
+        return self._equipped_weapon
+
+    @equipped_weapon.setter
+    def equipped_weapon(self, item):
+        self._equipped_weapon = item
+        self.stats.invalidate(EQUIPMENT_WEAPON)
+
+    @property
+    def equipped_armor(self):
+        return self._equipped_armor
+
+    @equipped_armor.setter
+    def equipped_armor(self, item):
+        self._equipped_armor = item
+        self.stats.invalidate(EQUIPMENT_ARMOR)
+
+    def get_attribute(self, attribute):
+        """Get an attribute including temporary modifiers"""
+        return self.stats.effective(attribute, self.attributes[attribute])
+
+    def get_skill(self, skill):
+        """Get a skill level including temporary modifiers"""
+        return self.stats.effective(skill, self.skills[skill])
+
+    def add_modifier(self, key, amount, duration=None):
+        """Add a modifier to an attribute, skill or derived stat (e.g. 'defense')"""
+        return self.stats.add_modifier(key, amount, duration)
+
+    def remove_modifier(self, modifier):
+        """Remove a modifier added with add_modifier"""
+        self.stats.remove_modifier(modifier)
+
     def calculate_max_hp(self):
         """Calculate max HP based on VITALITY"""
         base_hp = 100
-        vitality_bonus = self.attributes[Attribute.VITALITY] * 10
+        vitality_bonus = self.get_attribute(Attribute.VITALITY) * 10
         return base_hp + vitality_bonus
 
     def calculate_hp_regen(self):
         """Calculate HP regeneration based on VITALITY"""
         base_regen = 1
-        vitality_bonus = self.attributes[Attribute.VITALITY] * 0.2
+        vitality_bonus = self.get_attribute(Attribute.VITALITY) * 0.2
         return base_regen + vitality_bonus
 
     def calculate_max_stamina(self):
         """Calculate max stamina based on DEXTERITY"""
         base_stamina = 100
-        dexterity_bonus = self.attributes[Attribute.DEXTERITY] * 5
+        dexterity_bonus = self.get_attribute(Attribute.DEXTERITY) * 5
         return base_stamina + dexterity_bonus
 
     def calculate_stamina_regen(self):
         """Calculate stamina regeneration rate based on DEXTERITY"""
         base_regen = 1
-        dexterity_bonus = self.attributes[Attribute.DEXTERITY] * 0.2
+        dexterity_bonus = self.get_attribute(Attribute.DEXTERITY) * 0.2
         return base_regen + dexterity_bonus
 
     def calculate_defense(self):
         """Calculate defense based on attributes and skills"""
         base_defense = 10
-        vitality_bonus = self.attributes[Attribute.VITALITY] * 2
-        shield_bonus = self.skills[Skill.SHIELD_BLOCK] * 3
-        return base_defense + vitality_bonus + shield_bonus
+        vitality_bonus = self.get_attribute(Attribute.VITALITY) * 2
+        shield_bonus = self.get_skill(Skill.SHIELD_BLOCK) * 3
+        armor_bonus = getattr(self.equipped_armor, 'defense_bonus', 0)
+        return base_defense + vitality_bonus + shield_bonus + armor_bonus
 
     def calculate_damage_reduction(self):
         """Calculate damage reduction based on defense"""
@@ -160,21 +242,22 @@ class Player(Entity):
     def calculate_attack_power(self):
         """Calculate attack power based on STRENGTH and skills"""
         base_power = 10
-        strength_bonus = self.attributes[Attribute.STRENGTH] * 2
-        sword_bonus = self.skills[Skill.SWORD_MASTERY] * 3
-        return base_power + strength_bonus + sword_bonus
+        strength_bonus = self.get_attribute(Attribute.STRENGTH) * 2
+        sword_bonus = self.get_skill(Skill.SWORD_MASTERY) * 3
+        weapon_bonus = getattr(self.equipped_weapon, 'attack_bonus', 0)
+        return base_power + strength_bonus + sword_bonus + weapon_bonus
 
     def calculate_critical_chance(self):
         """Calculate critical hit chance based on DEXTERITY"""
         base_chance = 0.05
-        dexterity_bonus = self.attributes[Attribute.DEXTERITY] * 0.005
+        dexterity_bonus = self.get_attribute(Attribute.DEXTERITY) * 0.005
         return min(0.5, base_chance + dexterity_bonus)  # Cap at 50%
 
     def calculate_dodge_chance(self):
         """Calculate dodge chance based on DEXTERITY and EVASION skill"""
         base_chance = 0.05
-        dexterity_bonus = self.attributes[Attribute.DEXTERITY] * 0.003
-        evasion_bonus = self.skills[Skill.EVASION] * 0.02
+        dexterity_bonus = self.get_attribute(Attribute.DEXTERITY) * 0.003
+        evasion_bonus = self.get_skill(Skill.EVASION) * 0.02
         return min(0.4, base_chance + dexterity_bonus + evasion_bonus)  # Cap at 40%
 
     def update(self):
@@ -193,6 +276,9 @@ class Player(Entity):
             self.stamina = min(self.max_stamina, self.stamina + self.stamina_regen)
             self.stamina_regen_cooldown = 5  # 5 frames cooldown
 
+        # Expire temporary stat modifiers
+        self.stats.update()
+
         # Update status effects
         for effect in self.status_effects[:]:
             effect.duration -= 1
@@ -201,25 +287,29 @@ class Player(Entity):
                 if effect.effect_type == "STUNNED":
                     self.is_stunned = False
 
+    def calculate_damage_dealt(self, critical=False):
+        """Calculate the damage of one of the player's hits"""
+        if critical:
+            return self.attack_power * CRITICAL_HIT_MULTIPLIER
+        return self.attack_power
+
+    def calculate_damage_taken(self, amount, damage_type="physical"):
+        """Calculate the HP lost from an undodged hit"""
+        # Apply damage reduction
+        reduced_amount = amount * (1 - self.damage_reduction)
+        
+        # Apply damage type modifiers
+        reduced_amount *= DAMAGE_TYPE_MULTIPLIERS.get(damage_type, 1.0)
+        return int(reduced_amount)
+
     def take_damage(self, amount, damage_type="physical"):
         """Take damage with damage type consideration"""
         # Check for dodge
         if random.random() < self.dodge_chance:
             return False  # Dodged the attack
         
-        # Apply damage reduction
-        reduced_amount = amount * (1 - self.damage_reduction)
-        
-        # Apply damage type modifiers
-        if damage_type == "poison":
-            reduced_amount *= 0.8  # Poison deals 80% damage
-        elif damage_type == "fire":
-            reduced_amount *= 1.2  # Fire deals 120% damage
-        elif damage_type == "bleeding":
-            reduced_amount *= 0.9  # Bleeding deals 90% damage
-        
         # Apply the damage
-        self.hp = max(0, self.hp - int(reduced_amount))
+        self.hp = max(0, self.hp - self.calculate_damage_taken(amount, damage_type))
         
         # Set HP regeneration cooldown
         self.hp_regen_cooldown = 3
@@ -233,7 +323,7 @@ class Player(Entity):
     def heal(self, amount):
         """Heal the player by the given amount"""
         # Apply healing bonus from FAITH
-        faith_bonus = 1 + (self.attributes[Attribute.FAITH] * 0.05)
+        faith_bonus = 1 + (self.get_attribute(Attribute.FAITH) * 0.05)
         healing_amount = amount * faith_bonus
         
         old_hp = self.hp
@@ -274,30 +364,14 @@ class Player(Entity):
         self.attribute_points += 2
         self.skill_points += 1
         
-        # Update derived stats
-        self.max_hp = self.calculate_max_hp()
+        # Derived stats are recomputed lazily by the stat engine
         self.hp = self.max_hp
-        self.base_hp_regen = self.calculate_hp_regen()
-        self.defense = self.calculate_defense()
-        self.damage_reduction = self.calculate_damage_reduction()
-        self.attack_power = self.calculate_attack_power()
-        self.critical_chance = self.calculate_critical_chance()
-        self.dodge_chance = self.calculate_dodge_chance()
 
     def increase_attribute(self, attribute):
         """Increase an attribute if points are available"""
         if self.attribute_points > 0 and attribute in self.attributes:
             self.attributes[attribute] += 1
             self.attribute_points -= 1
-            
-            # Update derived stats
-            self.max_hp = self.calculate_max_hp()
-            self.base_hp_regen = self.calculate_hp_regen()
-            self.defense = self.calculate_defense()
-            self.damage_reduction = self.calculate_damage_reduction()
-            self.attack_power = self.calculate_attack_power()
-            self.critical_chance = self.calculate_critical_chance()
-            self.dodge_chance = self.calculate_dodge_chance()
             return True
         return False
 
@@ -306,17 +380,12 @@ class Player(Entity):
         if self.skill_points > 0 and skill in self.skills:
             self.skills[skill] += 1
             self.skill_points -= 1
-            
-            # Update derived stats
-            self.defense = self.calculate_defense()
-            self.attack_power = self.calculate_attack_power()
-            self.dodge_chance = self.calculate_dodge_chance()
             return True
         return False
 
     def get_attribute_modifier(self, attribute):
         """Get the modifier for an attribute (used for skill checks)"""
-        value = self.attributes[attribute]
+        value = self.get_attribute(attribute)
         return (value - 10) // 2
 
     def get_skill_level(self, skill):
@@ -0,0 +1,91 @@
+# Prefab stencils for stamping small terrain features into a level
+import numpy as np
+from core.sampling import AliasTable
+
+class Prefab:
+    def __init__(self, stencil, origin=(0, 0)):
+        """Initialize a prefab from a boolean stencil indexed [x, y], anchored at origin"""
+        self.stencil = np.asarray(stencil, dtype=bool)
+        offsets_x, offsets_y = np.nonzero(self.stencil)
+        self.offsets_x = offsets_x - origin[0]
+        self.offsets_y = offsets_y - origin[1]
+
+    @classmethod
+    def from_offsets(cls, offsets):
+        """Create a prefab covering the given (dx, dy) offsets from its anchor"""
+        offsets = np.array(offsets)
+        low = offsets.min(axis=0)
+        stencil = np.zeros(offsets.max(axis=0) - low + 1, dtype=bool)
+        stencil[offsets[:, 0] - low[0], offsets[:, 1] - low[1]] = True
+        return cls(stencil, origin=-low)
+
+    @classmethod
+    def square(cls, radius):
+        """Create a filled square centered on its anchor"""
+        return cls(np.ones((2 * radius + 1, 2 * radius + 1), dtype=bool), origin=(radius, radius))
+
+    @classmethod
+    def disk(cls, radius):
+        """Create a filled disk centered on its anchor"""
+        d = np.arange(-radius, radius + 1)
+        return cls(d[:, np.newaxis] ** 2 + d[np.newaxis, :] ** 2 <= radius ** 2, origin=(radius, radius))
+
+    def cells(self, xs, ys, bounds):
+        """Get the (x, y) index arrays covered by the prefab anchored at each (xs[i], ys[i])
+
+        Cells outside bounds (x0, y0, x1, y1), a half-open box, are clipped.
+        """
+        cell_x = (np.asarray(xs)[:, np.newaxis] + self.offsets_x).ravel()
+        cell_y = (np.asarray(ys)[:, np.newaxis] + self.offsets_y).ravel()
+        x0, y0, x1, y1 = bounds
+        inside = (cell_x >= x0) & (cell_x < x1) & (cell_y >= y0) & (cell_y < y1)
+        return cell_x[inside], cell_y[inside]
+
+def full_bounds(tiles):
+    """Get bounds covering the whole tile array"""
+    return (0, 0, tiles.shape[0], tiles.shape[1])
+
+def interior_bounds(tiles):
+    """Get bounds covering the tile array without its outer border"""
+    return (1, 1, tiles.shape[0] - 1, tiles.shape[1] - 1)
+
+def stamp_many(tiles, prefab, xs, ys, terrain, bounds=None, density=1.0, rng=None):
+    """Stamp a prefab of terrain at many anchor positions at once
+
+    With density below 1, each cell is kept with that probability, drawn from the
+    NumPy Generator rng.
+    """
+    cell_x, cell_y = prefab.cells(xs, ys, bounds or full_bounds(tiles))
+    if density < 1.0:
+        keep = rng.random(len(cell_x)) < density
+        cell_x, cell_y = cell_x[keep], cell_y[keep]
+    tiles[cell_x, cell_y] = terrain
+
+def stamp(tiles, prefab, x, y, terrain, bounds=None, density=1.0, rng=None):
+    """Stamp a prefab of terrain anchored at (x, y)"""
+    stamp_many(tiles, prefab, [x], [y], terrain, bounds, density, rng)
+
+# Library of feature prefabs, anchored at the tile they are placed on
+PREFABS = {
+    'single': Prefab.from_offsets([(0, 0)]),
+    'square': Prefab.from_offsets([(0, 0), (1, 0), (0, 1), (1, 1)]),  # 2x2 block
+    'cross': Prefab.from_offsets([(0, 0), (1, 0), (-1, 0), (0, 1), (0, -1)]),
+    'plus': Prefab.square(1),  # Full 3x3 block
+    'diamond': Prefab.from_offsets([(0, 0), (1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (-1, -1)]),
+    'zigzag': Prefab.from_offsets([(0, 0), (1, 1), (2, 0)]),
+    'triangle': Prefab.from_offsets([(j, i) for i in range(4) for j in range(i + 1)]),  # Spiral crystals
+    'ring': Prefab(np.pad(np.zeros((1, 1), dtype=bool), 1, constant_values=True), origin=(1, 1)),  # 3x3 ring
+    'markers': Prefab.from_offsets([(0, 4), (4, 0), (0, -4), (-4, 0)]),  # 4-way decoration around a clear area
+    'stair_clear': Prefab.square(3),  # 7x7 clear area around stairs
+}
+for length in range(2, 5):
+    PREFABS[f'line_horizontal_{length}'] = Prefab(np.ones((length, 1), dtype=bool))
+    PREFABS[f'line_vertical_{length}'] = Prefab(np.ones((1, length), dtype=bool))
+
+# Shape choices for scattered features; a tuple is a group of equally likely variants
+PATCH_SHAPES = ('square', 'cross', 'plus', 'diamond', 'zigzag')
+CRYSTAL_SHAPES = ('single', 'cross',
+                  tuple(f'line_{direction}_{length}' for direction in ('horizontal', 'vertical') for length in range(2, 5)),
+                  'triangle', 'plus')
+PILLAR_SHAPES = ('single',)
+SHAPE_TABLES = {shapes: AliasTable.from_choices(shapes) for shapes in (PATCH_SHAPES, CRYSTAL_SHAPES, PILLAR_SHAPES)}
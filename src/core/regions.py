@@ -0,0 +1,56 @@
+# Connected-region analysis of boolean tile masks
+import numpy as np
+
+def label_regions(mask):
+    """Label the 4-connected regions of a boolean mask indexed [x, y]
+
+    Returns (labels, sizes): labels is 0 outside the mask and 1..len(sizes) inside it,
+    and sizes[i] is the number of tiles in region i + 1. Regions are merged with
+    whole-array hooking and pointer jumping, so the number of passes grows with the
+    logarithm of the region size rather than its diameter.
+    """
+    mask = np.asarray(mask, dtype=bool)
+    index = np.arange(mask.size).reshape(mask.shape)
+
+    # Edges between horizontally and vertically adjacent tiles of the mask
+    horizontal = mask[:-1, :] & mask[1:, :]
+    vertical = mask[:, :-1] & mask[:, 1:]
+    a = np.concatenate((index[:-1, :][horizontal], index[:, :-1][vertical]))
+    b = np.concatenate((index[1:, :][horizontal], index[:, 1:][vertical]))
+
+    parent = np.arange(mask.size)
+    while True:
+        # Hook the root of each edge's larger end onto the smaller root. With duplicate
+        # targets the last assignment wins, so assign in decreasing order of value
+        root_a = parent[a]
+        root_b = parent[b]
+        split = root_a != root_b
+        if not split.any():
+            break
+        # Edges inside one region stay that way, so only split edges are kept
+        a, b = a[split], b[split]
+        root_a, root_b = root_a[split], root_b[split]
+        low = np.minimum(root_a, root_b)
+        targets = np.concatenate((root_a, root_b))
+        values = np.concatenate((low, low))
+        order = np.argsort(values)[::-1]
+        parent[targets[order]] = values[order]
+
+        # Shortcut every tile straight to its root
+        while True:
+            grandparent = parent[parent]
+            if (grandparent == parent).all():
+                break
+            parent = grandparent
+
+    roots, labels, sizes = np.unique(parent[mask.ravel()], return_inverse=True, return_counts=True)
+    region_labels = np.zeros(mask.shape, dtype=np.int32)
+    region_labels[mask] = labels + 1
+    return region_labels, sizes
+
+def largest_region(mask):
+    """Get a mask of the largest 4-connected region of a boolean mask"""
+    labels, sizes = label_regions(mask)
+    if not len(sizes):
+        return np.zeros_like(mask, dtype=bool)
+    return labels == np.argmax(sizes) + 1
@@ -0,0 +1,194 @@
+# Session replay recording and deterministic headless playback
+import hashlib
+import os
+import struct
+import tempfile
+from contextlib import contextmanager
+import tcod
+
+REPLAY_MAGIC = b"SLRP"
+# Version 3 records item and dialogue actions, without which older logs cannot reproduce
+# their sessions (their levels also came from a different generator seeding)
+REPLAY_VERSION = 3
+HEADER_FORMAT = "<4sBQ"  # Magic, version, world seed
+
+# Record opcodes, each followed by a fixed-size payload
+OP_MOVE = 1   # dx, dy
+OP_KEY = 2    # key symbol
+OP_QUIT = 3   # no payload
+OP_END = 4    # final state hash
+OP_VIEW = 5   # no payload; field of view refreshed after the moves of a frame
+OP_USE = 6    # inventory index of the used item
+OP_DROP = 7   # inventory index of the dropped item
+OP_TALK = 8   # x, y of the NPC spoken to
+OP_CHOOSE = 9  # index of the chosen option in the current conversation
+OP_LEAVE = 10  # no payload; current conversation ended
+RECORD_FORMATS = {
+    OP_MOVE: "<bb",
+    OP_KEY: "<I",
+    OP_QUIT: "",
+    OP_END: "<32s",
+    OP_VIEW: "",
+    OP_USE: "<B",
+    OP_DROP: "<B",
+    OP_TALK: "<hh",
+    OP_CHOOSE: "<B",
+    OP_LEAVE: "",
+}
+
+def state_hash(game):
+    """Compute a hash of the game state that a replay must reproduce"""
+    digest = hashlib.sha256()
+    player = game.player
+    digest.update(repr((
+        game.current_level, game.last_save_point, game.last_save_level,
+        player.x, player.y, player.hp, player.stamina, player.level, player.experience,
+        [item.name for item in player.inventory],
+    )).encode())
+    for level_num in sorted(game.levels):
+        level = game.levels[level_num]
+        digest.update(repr((level_num, level.stairs_up, level.stairs_down,
+                            sorted(level.stairs_discovered.items()), level.save_point,
+                            [(npc.name, npc.x, npc.y, npc.has_given_potion) for npc in level.npcs])).encode())
+        digest.update(level.tiles.tobytes())
+        digest.update(level.explored.tobytes())
+    return digest.digest()
+
+class ReplayRecorder:
+    def __init__(self, path, seed):
+        """Open an append-only replay log for a session started from the given seed"""
+        self.path = path
+        self.seed = seed
+        self._suspended = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.file = open(path, "ab")
+        if self.file.tell() == 0:
+            self.file.write(struct.pack(HEADER_FORMAT, REPLAY_MAGIC, REPLAY_VERSION, seed))
+            self.file.flush()
+
+    def _write(self, opcode, *payload):
+        """Append a single record and flush it so a crash loses nothing"""
+        if self._suspended or self.file.closed:
+            return
+        self.file.write(bytes((opcode,)) + struct.pack(RECORD_FORMATS[opcode], *payload))
+        self.file.flush()
+
+    @contextmanager
+    def suspended(self):
+        """Skip recording of actions that are caused by an already recorded event"""
+        self._suspended += 1
+        try:
+            yield
+        finally:
+            self._suspended -= 1
+
+    def record_event(self, event):
+        """Record an input event passed to Game.handle_input"""
+        if isinstance(event, tcod.event.Quit):
+            self._write(OP_QUIT)
+        elif isinstance(event, tcod.event.KeyDown):
+            self._write(OP_KEY, int(event.sym))
+
+    def record_move(self, dx, dy):
+        """Record a call to Game.move_player"""
+        self._write(OP_MOVE, dx, dy)
+
+    def record_view(self):
+        """Record a call to Game.refresh_view"""
+        self._write(OP_VIEW)
+
+    def record_use(self, index):
+        """Record a call to Game.use_item"""
+        self._write(OP_USE, index)
+
+    def record_drop(self, index):
+        """Record a call to Game.drop_item"""
+        self._write(OP_DROP, index)
+
+    def record_talk(self, x, y):
+        """Record a call to Game.talk_to"""
+        self._write(OP_TALK, x, y)
+
+    def record_choice(self, index):
+        """Record a call to Game.choose_dialogue_option"""
+        self._write(OP_CHOOSE, index)
+
+    def record_leave(self):
+        """Record a call to Game.end_dialogue"""
+        self._write(OP_LEAVE)
+
+    def close(self, game=None):
+        """Close the log, writing the final state hash if a game is given"""
+        if self.file.closed:
+            return
+        if game is not None:
+            self._write(OP_END, state_hash(game))
+        self.file.close()
+
+def read_replay(path):
+    """Read a replay log and return (seed, records) where records are (opcode, payload) tuples"""
+    with open(path, "rb") as f:
+        data = f.read()
+
+    header_size = struct.calcsize(HEADER_FORMAT)
+    magic, version, seed = struct.unpack_from(HEADER_FORMAT, data)
+    if magic != REPLAY_MAGIC:
+        raise ValueError(f"{path} is not a replay log")
+    if version != REPLAY_VERSION:
+        raise ValueError(f"{path} is a version {version} replay log; only version {REPLAY_VERSION} logs can be replayed")
+
+    records = []
+    offset = header_size
+    while offset < len(data):
+        opcode = data[offset]
+        record_format = RECORD_FORMATS[opcode]
+        size = struct.calcsize(record_format)
+        if offset + 1 + size > len(data):
+            break  # Truncated final record from an interrupted session
+        records.append((opcode, struct.unpack_from(record_format, data, offset + 1)))
+        offset += 1 + size
+    return seed, records
+
+def run_replay(path, save_dir=None):
+    """Re-run a recorded session headlessly and return (game, expected hashes, actual hashes)
+
+    Every OP_END record is checked against the state hash at that point in the log.
+    Saves triggered during playback go to save_dir (a temporary directory by default).
+    """
+    from core.game import Game
+
+    seed, records = read_replay(path)
+    with tempfile.TemporaryDirectory() as temp_dir:
+        game = Game(seed=seed)
+        game.save_dir = save_dir or temp_dir
+        expected, actual = [], []
+        for opcode, payload in records:
+            if opcode == OP_MOVE:
+                game.move_player(*payload)
+            elif opcode == OP_VIEW:
+                game.refresh_view()
+            elif opcode == OP_KEY:
+                event = tcod.event.KeyDown(0, tcod.event.KeySym(payload[0]), tcod.event.Modifier.NONE)
+                game.handle_input(event)
+            elif opcode == OP_QUIT:
+                game.handle_input(tcod.event.Quit())
+            elif opcode == OP_USE:
+                game.use_item(*payload)
+            elif opcode == OP_DROP:
+                game.drop_item(*payload)
+            elif opcode == OP_TALK:
+                npc = game.levels[game.current_level].get_npc_at(*payload)
+                if npc:
+                    game.talk_to(npc)
+            elif opcode == OP_CHOOSE and game.get_talking_npc():
+                game.choose_dialogue_option(game.get_talking_npc(), *payload)
+            elif opcode == OP_LEAVE and game.get_talking_npc():
+                game.end_dialogue(game.get_talking_npc())
+            elif opcode == OP_END:
+                expected.append(payload[0])
+                actual.append(state_hash(game))
+            game.update()
+        game.wait_for_saves()
+    return game, expected, actual
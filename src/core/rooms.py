@@ -0,0 +1,165 @@
+# Room placement and carving for dungeon levels
+import random
+import numpy as np
+import tcod
+from core.sampling import AliasTable
+from core.map import TERRAIN_GRASS, TERRAIN_ROCK, TERRAIN_WATER, TERRAIN_SAND
+
+ROOM_MARGIN = 2  # Minimum number of tiles between two rooms
+ROOM_AREA_PER_SCALE = 100 * 60  # Map area that gets the base number of room placement attempts
+BSP_DEPTH = 3  # Partition depth for a map of ROOM_AREA_PER_SCALE tiles (up to 8 rooms)
+BSP_MAX_RATIO = 1.5  # Maximum aspect ratio of a partition before it is split the other way
+
+# Room types with their base probabilities
+BASE_ROOM_TYPES = {
+    'normal': 0.3,     # Regular room
+    'water': 0.1,      # Water pool room
+    'sand': 0.1,       # Sandy room
+    'rocky': 0.1,      # Rocky room
+    'crystal': 0.1,    # Crystal formation room
+    'mossy': 0.05,    # Mossy room
+    'lava': 0.05,     # Lava room (deeper levels)
+    'fungal': 0.05,   # Fungal growth room
+    'bone': 0.05,     # Bone room
+    'treasure': 0.05,  # Treasure room
+    'ritual': 0.05    # Ritual room
+}
+ROOM_TYPES = tuple(BASE_ROOM_TYPES)
+ROOM_TYPE_BANDS = (0, 4, 7)  # First level of each band of levels sharing room type probabilities
+_room_type_tables = {}  # Alias table of each band, built on first use
+
+# Room styles: (floor terrain, scattered feature terrain, chance of a feature per tile)
+SCATTERED_ROOM_STYLES = {
+    'normal': (TERRAIN_GRASS, None, 0.0),
+    'sand': (TERRAIN_SAND, None, 0.0),
+    'rocky': (TERRAIN_GRASS, TERRAIN_ROCK, 0.2),      # Scattered rocks
+    'crystal': (TERRAIN_GRASS, TERRAIN_ROCK, 0.3),    # Crystal formations
+    'mossy': (TERRAIN_GRASS, TERRAIN_ROCK, 0.15),     # Scattered rocks and grass
+    'fungal': (TERRAIN_GRASS, TERRAIN_ROCK, 0.4),     # Fungal growth
+    'bone': (TERRAIN_SAND, TERRAIN_ROCK, 0.25),       # Bones
+    'treasure': (TERRAIN_GRASS, TERRAIN_ROCK, 0.1),   # Scattered rocks
+}
+POOL_ROOM_TYPES = ('water', 'lava')  # Pool with a walkable edge (lava is water for now)
+
+def room_type_weights(level):
+    """Get the normalized probability of each room type on a level"""
+    room_types = BASE_ROOM_TYPES.copy()
+    
+    # Increase chances of special rooms in deeper levels
+    if level > 3:
+        room_types['lava'] = 0.15
+        room_types['crystal'] = 0.15
+        room_types['ritual'] = 0.1
+    if level > 6:
+        room_types['bone'] = 0.15
+        room_types['fungal'] = 0.15
+        room_types['treasure'] = 0.1
+
+    # Normalize probabilities
+    total = sum(room_types.values())
+    return {k: v/total for k, v in room_types.items()}
+
+def room_type_table(level):
+    """Get the alias table for drawing the room types of a level"""
+    band = max(start for start in ROOM_TYPE_BANDS if start <= level)
+    if band not in _room_type_tables:
+        _room_type_tables[band] = AliasTable.from_dict(room_type_weights(band))
+    return _room_type_tables[band]
+
+def make_room(x, y, width, height, room_type):
+    """Create the dict describing a room"""
+    return {
+        'x': x,
+        'y': y,
+        'width': width,
+        'height': height,
+        'center_x': x + width // 2,
+        'center_y': y + height // 2,
+        'type': room_type
+    }
+
+def partition_rooms(width, height, depth, min_room_size, max_room_size, room_table, rng):
+    """Partition a map with a BSP tree and put one room inside each leaf
+
+    Rooms are returned in leaf order, so connecting consecutive rooms links the two
+    halves of every partition exactly once.
+    """
+    # Leaves leave one tile of wall around their room, keeping rooms ROOM_MARGIN apart.
+    # Splits are drawn from the game's random state so a seed reproduces the layout
+    min_leaf_size = min_room_size + ROOM_MARGIN
+    bsp = tcod.bsp.BSP(x=0, y=0, width=width, height=height)
+    nodes = [bsp]
+    for _ in range(depth):
+        next_nodes = []
+        for node in nodes:
+            can_split_x = node.width >= 2 * min_leaf_size
+            can_split_y = node.height >= 2 * min_leaf_size
+            if not (can_split_x or can_split_y):
+                continue
+            # Split long partitions across their length, otherwise pick a direction at random
+            if node.width > node.height * BSP_MAX_RATIO or not can_split_y:
+                horizontal = False
+            elif node.height > node.width * BSP_MAX_RATIO or not can_split_x:
+                horizontal = True
+            else:
+                horizontal = random.random() < 0.5
+            if horizontal:
+                node.split_once(True, random.randint(node.y + min_leaf_size, node.y + node.height - min_leaf_size))
+            else:
+                node.split_once(False, random.randint(node.x + min_leaf_size, node.x + node.width - min_leaf_size))
+            next_nodes.extend(node.children)
+        nodes = next_nodes
+
+    # Draw the size, position and type of every leaf's room at once
+    leaves = [node for node in bsp.in_order() if not node.children]
+    leaf_x = np.array([node.x for node in leaves])
+    leaf_y = np.array([node.y for node in leaves])
+    leaf_width = np.array([node.width for node in leaves])
+    leaf_height = np.array([node.height for node in leaves])
+    room_width = rng.integers(min_room_size, np.minimum(max_room_size, leaf_width - ROOM_MARGIN) + 1)
+    room_height = rng.integers(min_room_size, np.minimum(max_room_size, leaf_height - ROOM_MARGIN) + 1)
+    room_x = rng.integers(leaf_x + 1, leaf_x + leaf_width - room_width)
+    room_y = rng.integers(leaf_y + 1, leaf_y + leaf_height - room_height)
+    room_types = room_table.sample(rng, len(leaves))
+    return [make_room(int(x), int(y), int(w), int(h), room_type)
+            for x, y, w, h, room_type in zip(room_x, room_y, room_width, room_height, room_types)]
+
+class RoomPlacer:
+    def __init__(self, width, height):
+        """Initialize an occupancy bitmap of reserved room footprints"""
+        # A room reserves its area plus the margin to its right and bottom, so two rooms
+        # overlap exactly when their reserved footprints do
+        self.occupied = np.zeros((width + ROOM_MARGIN, height + ROOM_MARGIN), dtype=bool)
+
+    def _footprint(self, room):
+        """Get the slices of the footprint reserved by a room"""
+        return (slice(room['x'], room['x'] + room['width'] + ROOM_MARGIN),
+                slice(room['y'], room['y'] + room['height'] + ROOM_MARGIN))
+
+    def fits(self, room):
+        """Check if a room keeps its margin to every placed room"""
+        return not self.occupied[self._footprint(room)].any()
+
+    def place(self, room):
+        """Reserve the footprint of a room"""
+        self.occupied[self._footprint(room)] = True
+
+def carve_room(tiles, room, rng):
+    """Carve a room of its type into tiles, drawing decoration from a NumPy Generator"""
+    area = (slice(room['x'], room['x'] + room['width']), slice(room['y'], room['y'] + room['height']))
+    room_type = room['type']
+
+    if room_type in POOL_ROOM_TYPES:
+        # Create a pool with walkable edges
+        tiles[area] = TERRAIN_GRASS
+        tiles[room['x'] + 1:room['x'] + room['width'] - 1, room['y'] + 1:room['y'] + room['height'] - 1] = TERRAIN_WATER
+    elif room_type == 'ritual':
+        # Create a ritual room with a pillar on every third tile
+        tiles[area] = TERRAIN_GRASS
+        tiles[room['x']:room['x'] + room['width']:3, room['y']:room['y'] + room['height']:3] = TERRAIN_ROCK
+    else:
+        floor, feature, chance = SCATTERED_ROOM_STYLES[room_type]
+        tiles[area] = floor
+        if feature is not None:
+            region = tiles[area]
+            region[rng.random(region.shape) < chance] = feature
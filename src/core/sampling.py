@@ -0,0 +1,47 @@
+# Weighted sampling with precomputed alias tables
+import numpy as np
+
+class AliasTable:
+    def __init__(self, outcomes, weights):
+        """Precompute Walker's alias table for drawing outcomes with the given weights"""
+        self.outcomes = np.array(outcomes, dtype=object)
+        weights = np.asarray(weights, dtype=float)
+        count = len(weights)
+        scaled = weights * count / weights.sum()
+
+        # Vose's method: pair every under-full column with an over-full one
+        self.accept = np.ones(count)
+        self.alias = np.arange(count)
+        small = [i for i in range(count) if scaled[i] < 1.0]
+        large = [i for i in range(count) if scaled[i] >= 1.0]
+        while small and large:
+            low = small.pop()
+            high = large.pop()
+            self.accept[low] = scaled[low]
+            self.alias[low] = high
+            scaled[high] -= 1.0 - scaled[low]
+            (small if scaled[high] < 1.0 else large).append(high)
+
+    def sample_indices(self, rng, size):
+        """Draw size outcome indices with the NumPy Generator rng"""
+        columns = rng.integers(len(self.accept), size=size)
+        return np.where(rng.random(size) < self.accept[columns], columns, self.alias[columns])
+
+    def sample(self, rng, size):
+        """Draw size outcomes with the NumPy Generator rng"""
+        return self.outcomes[self.sample_indices(rng, size)]
+
+    @classmethod
+    def from_dict(cls, weights):
+        """Create a table from {outcome: weight}"""
+        return cls(list(weights), list(weights.values()))
+
+    @classmethod
+    def from_choices(cls, choices):
+        """Create a table of equally likely choices; a tuple is a group of equally likely variants"""
+        weights = {}
+        for choice in choices:
+            variants = choice if isinstance(choice, tuple) else (choice,)
+            for variant in variants:
+                weights[variant] = weights.get(variant, 0.0) + 1.0 / (len(choices) * len(variants))
+        return cls.from_dict(weights)
@@ -0,0 +1,332 @@
+# Save file writing: atomic writes and a background writer thread
+import hashlib
+import json
+import os
+import pickle
+import queue
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+SAVE_EXTENSION = ".sav"
+SAVE_HEADER_FORMAT = "soulslike-save-header"  # Marks the small header pickled before the body
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+BLOB_DIR = "blobs"  # Shared store of level data keyed by content hash
+BLOB_EXTENSION = ".lvl"
+KEEP_LAST_SAVES = 10  # Retention: always keep this many of the newest saves
+
+_manifest_lock = threading.RLock()  # Saves may finish on the writer thread and the main thread
+
+def write_atomic(path, data):
+    """Write bytes to path so readers only ever see the old or the complete new file
+
+    data may also be a function that writes the contents to a binary file object.
+    """
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+
+    # Write to a temporary file in the same directory, then rename it over the target
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            if callable(data):
+                data(f)
+            else:
+                f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    # Persist the rename itself (not supported on every platform)
+    if hasattr(os, "O_DIRECTORY"):
+        dir_fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+def save_header(path, save_data):
+    """Build the small header stored in front of a save and in the manifest"""
+    filename = os.path.basename(path)
+    player = save_data.get('player', {})
+    return {
+        'format': SAVE_HEADER_FORMAT,
+        'path': filename,
+        # Rolling saves keep their file name, so prefer the time they were last written
+        'timestamp': save_data.get('saved_at', filename[5:-len(SAVE_EXTENSION)]),
+        'current_level': save_data.get('current_level', 0),
+        'player_level': player.get('level', 1),
+        'play_time': save_data.get('play_time', 0.0),
+        'blob_store': any('blob' in level for level in save_data.get('levels', {}).values()),
+        'world': save_data.get('world_id'),  # Playthrough the save belongs to; retention stays within it
+        'blobs': sorted({level['blob'] for level in save_data.get('levels', {}).values() if 'blob' in level}),
+    }
+
+def write_save(path, save_data):
+    """Serialize save data and write it atomically, returning (success, message)"""
+    try:
+        # The header is pickled first so it can be read without loading the levels
+        header = save_header(path, save_data)
+        data = (pickle.dumps(header, protocol=pickle.HIGHEST_PROTOCOL) +
+                pickle.dumps(save_data, protocol=pickle.HIGHEST_PROTOCOL))
+        write_atomic(path, data)
+        update_manifest(os.path.dirname(path), header)
+        return True, f"Game saved to {path}"
+    except Exception as e:
+        return False, f"Failed to save game: {str(e)}"
+
+def write_memmap_save(path, save_data, arrays):
+    """Write snapshot level arrays to new .npy files, then the save that points at them
+
+    arrays maps paths inside the save directory to array copies. Files are never
+    overwritten, so the save file's rename is the only commit point; afterwards the
+    array files of the world that the save no longer references are deleted.
+    """
+    save_dir = os.path.dirname(path)
+    try:
+        for array_path, array in arrays.items():
+            write_atomic(os.path.join(save_dir, array_path), lambda f, array=array: np.save(f, array))
+    except Exception as e:
+        return False, f"Failed to save game: {str(e)}"
+
+    result = write_save(path, save_data)
+    if result[0]:
+        referenced = {os.path.join(level['memmap'], filename)
+                      for level in save_data['levels'].values() for filename in level['arrays'].values()}
+        for world_dir in {level['memmap'] for level in save_data['levels'].values()}:
+            for filename in os.listdir(os.path.join(save_dir, world_dir)):
+                if filename.endswith(".npy") and os.path.join(world_dir, filename) not in referenced:
+                    try:
+                        os.remove(os.path.join(save_dir, world_dir, filename))
+                    except OSError:
+                        pass  # Still mapped where that is locked; a later save retries
+    return result
+
+def read_save(path):
+    """Read the full save data from a save file"""
+    with open(path, "rb") as f:
+        first = pickle.load(f)
+        if isinstance(first, dict) and first.get('format') == SAVE_HEADER_FORMAT:
+            return pickle.load(f)
+        return first  # Old saves are a single pickle without a header
+
+def read_save_header(path):
+    """Read only the header of a save file"""
+    with open(path, "rb") as f:
+        first = pickle.load(f)
+    if isinstance(first, dict) and first.get('format') == SAVE_HEADER_FORMAT:
+        return first
+    # Old saves have no header, so build one from the full data
+    return save_header(path, first)
+
+def rebuild_manifest(save_dir):
+    """Rebuild the manifest from the headers of the save files in save_dir"""
+    entries = {}
+    if os.path.isdir(save_dir):
+        for filename in os.listdir(save_dir):
+            if not filename.endswith(SAVE_EXTENSION):
+                continue
+            try:
+                entries[filename] = read_save_header(os.path.join(save_dir, filename))
+            except Exception:
+                continue  # Skip unreadable saves
+    return entries
+
+def read_manifest(save_dir):
+    """Get the manifest entries of save_dir as {filename: header}, rebuilding it if needed"""
+    with _manifest_lock:
+        manifest_path = os.path.join(save_dir, MANIFEST_NAME)
+        try:
+            with open(manifest_path, "r") as f:
+                manifest = json.load(f)
+            if manifest.get('version') == MANIFEST_VERSION:
+                return manifest['saves']
+        except (OSError, ValueError, KeyError, AttributeError):
+            pass
+
+        entries = rebuild_manifest(save_dir)
+        if entries:
+            _write_manifest(save_dir, entries)
+        return entries
+
+def list_save_entries(save_dir):
+    """List the manifest entries of all saves, newest first, without opening the save files"""
+    entries = read_manifest(save_dir).values()
+    return sorted(entries, key=lambda entry: entry['timestamp'], reverse=True)
+
+def update_manifest(save_dir, header):
+    """Add or replace a save's entry in the manifest"""
+    with _manifest_lock:
+        entries = read_manifest(save_dir)
+        entries[header['path']] = header
+        _write_manifest(save_dir, entries)
+
+def remove_from_manifest(save_dir, filenames):
+    """Remove the entries of deleted saves from the manifest"""
+    with _manifest_lock:
+        entries = read_manifest(save_dir)
+        for filename in filenames:
+            entries.pop(filename, None)
+        _write_manifest(save_dir, entries)
+
+def _write_manifest(save_dir, entries):
+    """Write the manifest atomically"""
+    data = json.dumps({'version': MANIFEST_VERSION, 'saves': entries}, indent=1)
+    write_atomic(os.path.join(save_dir, MANIFEST_NAME), data.encode())
+
+class SaveStore:
+    def __init__(self, save_dir, keep_last=KEEP_LAST_SAVES):
+        """Initialize a store where saves are small files pointing at shared level blobs"""
+        self.save_dir = save_dir
+        self.keep_last = keep_last
+        self.level_blobs = {}  # Blob hash of the last written copy of each level
+
+    def blob_path(self, blob_hash):
+        """Get the path of a level blob"""
+        return os.path.join(self.save_dir, BLOB_DIR, blob_hash[:2], blob_hash + BLOB_EXTENSION)
+
+    def write_blob(self, level_data):
+        """Store level data under its content hash and return the hash"""
+        data = pickle.dumps(level_data, protocol=pickle.HIGHEST_PROTOCOL)
+        blob_hash = hashlib.sha256(data).hexdigest()
+        path = self.blob_path(blob_hash)
+        if not os.path.exists(path):
+            write_atomic(path, data)
+        return blob_hash
+
+    def read_blob(self, blob_hash):
+        """Read the level data stored under a hash"""
+        with open(self.blob_path(blob_hash), "rb") as f:
+            return pickle.load(f)
+
+    def write(self, path, save_data):
+        """Write a save, storing changed levels as blobs, and return (success, message)
+
+        Levels given as None are unchanged since the previous save and reuse its blob.
+        """
+        try:
+            levels = {}
+            for level_num, level_data in save_data['levels'].items():
+                if level_data is not None:
+                    self.level_blobs[level_num] = self.write_blob(level_data)
+                elif level_num not in self.level_blobs:
+                    raise KeyError(f"no stored copy of level {level_num}")
+                levels[level_num] = {'blob': self.level_blobs[level_num]}
+        except Exception as e:
+            return False, f"Failed to save game: {str(e)}"
+
+        result = write_save(path, dict(save_data, levels=levels))
+        if result[0]:
+            self.apply_retention(save_data.get('world_id'))
+        return result
+
+    def read_levels(self, save_data):
+        """Get {level number: level data} for a save, reading blobs as needed"""
+        levels = {}
+        for level_num, level_data in save_data['levels'].items():
+            if 'blob' in level_data:
+                levels[level_num] = self.read_blob(level_data['blob'])
+            else:
+                levels[level_num] = level_data  # Memory-mapped levels and saves written before the blob store
+        return levels
+
+    def apply_retention(self, world_id):
+        """Delete old saves of a world, keeping the newest ones plus one per hour, then collect garbage
+
+        Saves of other worlds, and saves written before the blob store or without a
+        world, are never deleted.
+        """
+        if world_id is None:
+            return
+        entries = sorted((entry for entry in read_manifest(self.save_dir).values()
+                          if entry.get('blob_store') and entry.get('world') == world_id),
+                         key=lambda entry: entry['timestamp'], reverse=True)
+        keep = {entry['path'] for entry in entries[:self.keep_last]}
+        hours = set()
+        for entry in entries:
+            hour = entry['timestamp'][:11]  # YYYYMMDD_HH
+            if hour not in hours:
+                hours.add(hour)
+                keep.add(entry['path'])
+
+        removed = [entry['path'] for entry in entries if entry['path'] not in keep]
+        for filename in removed:
+            try:
+                os.remove(os.path.join(self.save_dir, filename))
+            except FileNotFoundError:
+                pass
+        if removed:
+            remove_from_manifest(self.save_dir, removed)
+            self.collect_garbage()
+
+    def collect_garbage(self):
+        """Delete blobs that no save references
+
+        References come from the manifest; only saves whose entries predate blob lists
+        in the manifest are opened.
+        """
+        referenced = set(self.level_blobs.values())
+        for filename, entry in read_manifest(self.save_dir).items():
+            if 'blobs' in entry:
+                referenced.update(entry['blobs'])
+                continue
+            try:
+                save_data = read_save(os.path.join(self.save_dir, filename))
+            except FileNotFoundError:
+                continue  # Deleted saves reference nothing
+            except Exception:
+                return  # Never delete blobs while a save cannot be checked
+            for level_data in save_data.get('levels', {}).values():
+                if 'blob' in level_data:
+                    referenced.add(level_data['blob'])
+
+        blob_root = os.path.join(self.save_dir, BLOB_DIR)
+        for directory, _, filenames in os.walk(blob_root):
+            for filename in filenames:
+                if filename.endswith(BLOB_EXTENSION) and filename[:-len(BLOB_EXTENSION)] not in referenced:
+                    os.remove(os.path.join(directory, filename))
+
+class SaveWriter:
+    def __init__(self, store):
+        """Initialize a writer that serializes and writes saves to a store on a background thread"""
+        # A single worker keeps saves in submission order
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="save-writer")
+        self.store = store
+        self.results = queue.Queue()
+        self.pending = []
+
+    def submit(self, path, save_data, write=None, *args):
+        """Queue a snapshot for writing; the result is reported through poll()
+
+        write defaults to the store's write and is called as write(path, save_data, *args).
+        """
+        future = self.executor.submit(write or self.store.write, path, save_data, *args)
+        future.add_done_callback(lambda f: self.results.put(f.result()))
+        self.pending.append(future)
+
+    def poll(self):
+        """Get the (success, message) results of saves finished since the last call"""
+        self.pending = [future for future in self.pending if not future.done()]
+        finished = []
+        while True:
+            try:
+                finished.append(self.results.get_nowait())
+            except queue.Empty:
+                return finished
+
+    @property
+    def busy(self):
+        """Check if any save is still being written"""
+        return any(not future.done() for future in self.pending)
+
+    def wait(self):
+        """Block until every queued save has been written"""
+        for future in self.pending:
+            future.result()
@@ -0,0 +1,32 @@
+# Fixed-rate simulation ticks, decoupled from how often frames are drawn
+import time
+from utils.constants import TICK_RATE
+
+MAX_TICKS_PER_FRAME = 5  # Ticks run at most per frame before the backlog is dropped
+
+class TickScheduler:
+    def __init__(self, tick_rate=TICK_RATE, clock=time.monotonic):
+        """Initialize a scheduler of tick_rate ticks per second of the given clock"""
+        self.tick_length = 1.0 / tick_rate
+        self.clock = clock
+        self.next_tick = clock()
+
+    def due_ticks(self):
+        """Get how many ticks are due now and schedule the following one
+
+        After a long stall (a slow level generation, a dragged window) at most
+        MAX_TICKS_PER_FRAME ticks are run and the rest of the backlog is dropped,
+        so the simulation never spirals into catching up.
+        """
+        now = self.clock()
+        ticks = 0
+        while self.next_tick <= now and ticks < MAX_TICKS_PER_FRAME:
+            ticks += 1
+            self.next_tick += self.tick_length
+        if self.next_tick <= now:
+            self.next_tick = now + self.tick_length
+        return ticks
+
+    def time_until_tick(self):
+        """Get the seconds left until the next tick is due"""
+        return max(0.0, self.next_tick - self.clock())
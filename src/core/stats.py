@@ -0,0 +1,114 @@
+# Derived stat engine that caches stats and recomputes them only when an input changes
+
+class TrackedDict(dict):
+    def __init__(self, data, on_change):
+        """Initialize a dict that reports every changed key to a callback"""
+        super().__init__(data)
+        self.on_change = on_change
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.on_change(key)
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self.on_change(key)
+
+    def update(self, *args, **kwargs):
+        changed = dict(*args, **kwargs)
+        super().update(changed)
+        for key in changed:
+            self.on_change(key)
+
+    def __reduce__(self):
+        # Pickle as a plain dict so saves never drag the owner along
+        return (dict, (dict(self),))
+
+class StatModifier:
+    def __init__(self, key, amount, duration=None):
+        """Initialize a modifier on an input (attribute/skill) or a derived stat"""
+        self.key = key
+        self.amount = amount
+        self.duration = duration  # Turns left, None for permanent
+
+class StatEngine:
+    def __init__(self, owner, dependencies):
+        """Initialize the engine with a {stat: (method name, inputs)} table"""
+        self.owner = owner
+        self.dependencies = dependencies
+        self.cache = {}
+        self.modifiers = []
+        self.modifier_totals = {}
+
+        # Map every input (and every stat) to all stats that must be recomputed when it changes
+        self.dependents = {}
+        for stat in dependencies:
+            for key in self._inputs_of(stat):
+                self.dependents.setdefault(key, set()).add(stat)
+            self.dependents.setdefault(stat, set()).add(stat)
+
+    def _inputs_of(self, stat):
+        """Get the transitive inputs of a derived stat"""
+        inputs = set()
+        pending = list(self.dependencies[stat][1])
+        while pending:
+            key = pending.pop()
+            if key in inputs:
+                continue
+            inputs.add(key)
+            if key in self.dependencies:
+                pending.extend(self.dependencies[key][1])
+        return inputs
+
+    def get(self, stat):
+        """Get a derived stat, recomputing it only if one of its inputs changed"""
+        try:
+            return self.cache[stat]
+        except KeyError:
+            method_name = self.dependencies[stat][0]
+            value = getattr(self.owner, method_name)() + self.modifier_totals.get(stat, 0)
+            self.cache[stat] = value
+            return value
+
+    def effective(self, key, base):
+        """Get the value of an input including its active modifiers"""
+        return base + self.modifier_totals.get(key, 0)
+
+    def invalidate(self, key):
+        """Drop every cached stat that depends on the given input or stat"""
+        for stat in self.dependents.get(key, ()):
+            self.cache.pop(stat, None)
+
+    def invalidate_all(self):
+        """Drop every cached stat"""
+        self.cache.clear()
+
+    def add_modifier(self, key, amount, duration=None):
+        """Add a modifier to an input or derived stat and return it"""
+        modifier = StatModifier(key, amount, duration)
+        self.modifiers.append(modifier)
+        self.modifier_totals[key] = self.modifier_totals.get(key, 0) + amount
+        self.invalidate(key)
+        return modifier
+
+    def remove_modifier(self, modifier):
+        """Remove a previously added modifier"""
+        if modifier in self.modifiers:
+            self.modifiers.remove(modifier)
+            self.modifier_totals[modifier.key] -= modifier.amount
+            if not self.modifier_totals[modifier.key]:
+                del self.modifier_totals[modifier.key]
+            self.invalidate(modifier.key)
+
+    def update(self):
+        """Tick temporary modifiers and expire the finished ones"""
+        for modifier in self.modifiers[:]:
+            if modifier.duration is None:
+                continue
+            modifier.duration -= 1
+            if modifier.duration <= 0:
+                self.remove_modifier(modifier)
+
+def derived_stat(name):
+    """Create a read-only property that reads a stat through the owner's engine"""
+    return property(lambda self: self.stats.get(name), doc=f"Derived stat '{name}'")
@@ -2,279 +2,340 @@
 import os
 import sys
 import tcod
-from tcod import libtcodpy
-import pickle
 
 # Add the src directory to the Python path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from core.game import Game
-from core.player import Player
-from core.map import Map
-from rendering.renderer import Renderer
-from rendering.character_screen import CharacterScreenRenderer
-from rendering.pause_screen import PauseScreenRenderer
+# Only what the main menu needs is imported up front; the game, the world generator and
+# the in-game screens are imported once the player starts or loads a game
+from core.keymap import (InputDispatcher, MODE_GAMEPLAY, MODE_INVENTORY, MODE_DIALOGUE, MODE_PAUSE,
+                         MODE_CHARACTER)
+from core.saving import list_save_entries
+from core.scheduler import TickScheduler
 from rendering.main_menu import MainMenuRenderer
+from rendering.tilesets import TilesetManager
 from utils.colors import *
-from rendering.map_renderer import MapRenderer
-from rendering.inventory_screen import InventoryScreenRenderer
-from core.items import HealthPotion, StaminaPotion, StrengthPotion, DefensePotion
-from rendering.dialogue_screen import DialogueScreenRenderer
-from core.npc import get_dialogue_for_npc
-
-def show_main_menu(console, game, renderer, character_screen, pause_screen, main_menu):
-    """Show the main menu and handle menu options"""
-    # Create a new game instance if none exists
-    if not game:
-        game = Game()
-    
-    # Check for save files
-    has_save = bool(game.list_saves())
+from utils.constants import SAVE_DIR
+
+def show_main_menu(context, console, main_menu):
+    """Show the main menu and return the started or loaded game, or None to quit"""
+    # Read the save manifest once; this never opens the save files themselves
+    saves = list_save_entries(SAVE_DIR)
+    has_save = bool(saves)
+    browsing_saves = False
+    selected_save = 0
     
     while True:
         # Clear the console
         console.clear()
         
-        # Render the main menu
-        main_menu.render(has_save)
+        # Render the main menu or the save browser
+        if browsing_saves:
+            main_menu.render_save_list(saves, selected_save)
+        else:
+            main_menu.render(has_save, saves[0] if has_save else None)
         
         # Present the console
-        tcod.console_flush()
+        context.present(console)
         
-        # Handle input
+        # Handle input; nothing on the menu changes without it, so block until there is some
         for event in tcod.event.wait():
             if isinstance(event, tcod.event.Quit):
                 return None
+            elif isinstance(event, tcod.event.KeyDown) and browsing_saves:
+                if event.sym == tcod.event.KeySym.ESCAPE:
+                    browsing_saves = False
+                elif event.sym == tcod.event.KeySym.UP:
+                    selected_save = max(0, selected_save - 1)
+                elif event.sym == tcod.event.KeySym.DOWN:
+                    selected_save = min(len(saves) - 1, selected_save + 1)
+                elif event.sym in (tcod.event.KeySym.RETURN, tcod.event.KeySym.KP_ENTER):
+                    # A loaded game never generates a level of its own
+                    from core.game import Game
+                    game = Game(generate=False)
+                    success, message = game.load_game(os.path.join(SAVE_DIR, saves[selected_save]['path']))
+                    if success:
+                        return game
+                    print(f"Failed to load game: {message}")
             elif isinstance(event, tcod.event.KeyDown):
                 if event.sym == tcod.event.KeySym.KP_1 or event.sym == tcod.event.KeySym.N1:
-                    # Start new game
+                    # Generate the world only now, and record the new game for replays
+                    from core.game import Game
+                    game = Game()
+                    game.start_recording()
                     return game
                 elif event.sym == tcod.event.KeySym.KP_2 or event.sym == tcod.event.KeySym.N2:
-                    # Load game
+                    # Browse saves, newest first
                     if has_save:
-                        saves = game.list_saves()
-                        if saves:
-                            save_path, _ = saves[0]  # Get the most recent save
-                            success, message = game.load_game(save_path)
-                            if success:
-                                return game
-                            else:
-                                print(f"Failed to load game: {message}")
-                                return None
-                    return None
+                        browsing_saves = True
+                        selected_save = 0
                 elif event.sym == tcod.event.KeySym.KP_3 or event.sym == tcod.event.KeySym.N3:
                     # Quit game
                     return None
 
+def create_game_screens(console):
+    """Create the in-game renderers, importing them on first use"""
+    from rendering.renderer import Renderer
+    from rendering.pause_screen import PauseScreenRenderer
+    from rendering.character_screen import CharacterScreenRenderer
+    from rendering.inventory_screen import InventoryScreenRenderer
+    from rendering.dialogue_screen import DialogueScreenRenderer
+    return (Renderer(console), PauseScreenRenderer(console), CharacterScreenRenderer(console),
+            InventoryScreenRenderer(console), DialogueScreenRenderer(console))
+
 def main():
-    # Initialize the console
-    console = tcod.console_init_root(80, 50, "Soulslike", False)
-    
-    # Create game instance
-    game = Game()
-    
-    # Create renderers
-    renderer = Renderer(console)
-    pause_screen = PauseScreenRenderer(console)
-    character_screen = CharacterScreenRenderer(console)
-    main_menu = MainMenuRenderer(console)
-    map_renderer = MapRenderer(console)
-    inventory_screen = InventoryScreenRenderer(console)
-    dialogue_screen = DialogueScreenRenderer(console)
-    
-    # Add some test items to the player's inventory
-    game.player.add_to_inventory(HealthPotion())
-    game.player.add_to_inventory(StaminaPotion())
-    game.player.add_to_inventory(StrengthPotion())
-    game.player.add_to_inventory(DefensePotion())
-    
-    # Show main menu first
-    game = show_main_menu(console, None, renderer, character_screen, pause_screen, main_menu)
-    if not game:
-        return
+    # Initialize the window and console
+    tilesets = TilesetManager()
+    console = tcod.console.Console(80, 50, order="F")
+    with tcod.context.new(console=console, tileset=tilesets.get_tileset(), title="Soulslike", vsync=True) as context:
+        main_menu = MainMenuRenderer(console)
+        
+        # Show main menu first; no world exists until a game is started or loaded
+        game = show_main_menu(context, console, main_menu)
+        if not game:
+            return
+        
+        renderer, pause_screen, character_screen, inventory_screen, dialogue_screen = create_game_screens(console)
+        try:
+            run_game_loop(context, console, game, renderer, pause_screen, character_screen, main_menu,
+                          inventory_screen, dialogue_screen)
+        finally:
+            # Finish the replay log and any pending saves of whichever game was running
+            from core.game import Game
+            Game.get_instance().stop_recording()
+            Game.get_instance().wait_for_saves()
+
+def find_adjacent_npc(game, talking=False):
+    """Find an NPC within one tile of the player, only one in dialogue if talking"""
+    current_map = game.levels[game.current_level]
+    for dx in range(-1, 2):
+        for dy in range(-1, 2):
+            npc = current_map.get_npc_at(game.player.x + dx, game.player.y + dy)
+            if npc and (npc.is_talking or not talking):
+                return npc
+    return None
+
+def render_frame(context, console, game, renderer, pause_screen, character_screen,
+                 inventory_screen, dialogue_screen):
+    """Draw the game and its open screen, and present the frame"""
+    console.clear()
+
+    # Render the game map first
+    renderer.render_all(game, game.player, None)
+
+    # Then render any overlays
+    if game.is_paused:
+        pause_screen.render()
+    elif game.show_character_screen:
+        character_screen.render(game.player)
+    elif inventory_screen.visible:
+        # Draw a semi-transparent background for the inventory
+        for x in range(80):
+            for y in range(50):
+                console.print(x, y, " ", bg=(0, 0, 0))
+        inventory_screen.render(game.player)
+    elif dialogue_screen.visible:
+        # Draw a semi-transparent background for the dialogue
+        for x in range(80):
+            for y in range(50):
+                console.print(x, y, " ", bg=(0, 0, 0))
+        # Find the NPC that's currently in dialogue
+        current_npc = find_adjacent_npc(game, talking=True)
+        if current_npc:
+            dialogue_screen.render(current_npc)
+
+    # Render NPCs last
+    current_map = game.levels[game.current_level]
+    for npc in current_map.npcs:
+        # Only render NPCs that are visible and not in dialogue
+        if current_map.visible[npc.x, npc.y] and not npc.is_talking:
+            console.print(npc.x, npc.y, npc.char, fg=npc.color)
+
+    # Present the console
+    context.present(console)
+
+class GameInput:
+    """Actions of the in-game input modes, dispatched from the keymap in core.keymap"""
+    QUIT = "quit"
+    MAIN_MENU = "main_menu"
+
+    def __init__(self, game, inventory_screen, dialogue_screen):
+        self.game = game
+        self.inventory_screen = inventory_screen
+        self.dialogue_screen = dialogue_screen
+        self.moved = False  # Moves were applied since the view was last refreshed
+        self.dispatcher = InputDispatcher({
+            MODE_GAMEPLAY: {
+                'move': self.move,
+                'pause': self.pause,
+                'character_screen': self.open_character_screen,
+                'inventory': self.open_inventory,
+                'interact': self.interact,
+            },
+            MODE_INVENTORY: {
+                'close': self.close_inventory,
+                'select': self.select_item,
+                'use': self.use_item,
+                'drop': self.drop_item,
+            },
+            MODE_DIALOGUE: {
+                'close': self.close_dialogue,
+                'select': self.select_option,
+                'choose': self.choose_option,
+            },
+            MODE_PAUSE: {
+                'resume': self.resume,
+                'main_menu': lambda event: self.MAIN_MENU,
+                'quit': lambda event: self.QUIT,
+            },
+            MODE_CHARACTER: {
+                'close': self.close_character_screen,
+            },
+        })
+
+    def handle(self, event):
+        """Handle an event, returning QUIT or MAIN_MENU if the game loop should leave"""
+        if isinstance(event, tcod.event.Quit):
+            return self.QUIT
+        return self.dispatcher.dispatch(event)
+
+    def start(self, game):
+        """Switch to a new game, starting back in gameplay"""
+        self.game = game
+        self.moved = False
+        self.inventory_screen.visible = False
+        self.dialogue_screen.visible = False
+        self.dispatcher.reset()
+
+    # Gameplay
+    def move(self, event, dx, dy):
+        """Move the player; the view is refreshed at the end of the frame"""
+        self.game.move_player(dx, dy)
+        self.moved = True
+
+    def pause(self, event):
+        """Open the pause menu"""
+        self.game.is_paused = True
+        self.dispatcher.push(MODE_PAUSE)
+
+    def open_character_screen(self, event):
+        """Open the character screen"""
+        self.game.show_character_screen = True
+        self.dispatcher.push(MODE_CHARACTER)
+
+    def open_inventory(self, event):
+        """Open the inventory screen on its first item"""
+        self.inventory_screen.visible = True
+        self.inventory_screen.selected_index = 0
+        self.inventory_screen.current_page = 0
+        self.dispatcher.push(MODE_INVENTORY)
+
+    def interact(self, event):
+        """Talk to an NPC in a one tile radius, or else use the save point underfoot"""
+        npc = find_adjacent_npc(self.game)
+        if npc:
+            self.dialogue_screen.show(self.game, npc)
+            self.dispatcher.push(MODE_DIALOGUE)
+        elif self.game.levels[self.game.current_level].is_save_point(self.game.player.x, self.game.player.y):
+            self.game.handle_input(event)
+
+    # Inventory
+    def close_inventory(self, event):
+        """Close the inventory screen"""
+        self.inventory_screen.close()
+        self.dispatcher.pop()
+
+    def select_item(self, event, step):
+        """Move the inventory selection by step"""
+        self.inventory_screen.select(self.game.player, step)
+
+    def use_item(self, event):
+        """Use the selected item"""
+        self.inventory_screen.use_selected(self.game)
+
+    def drop_item(self, event):
+        """Drop the selected item"""
+        self.inventory_screen.drop_selected(self.game)
+
+    # Dialogue
+    def close_dialogue(self, event):
+        """Close the dialogue screen and end the conversation"""
+        npc = find_adjacent_npc(self.game, talking=True)
+        if npc:
+            self.dialogue_screen.close(self.game, npc)
+        self.dialogue_screen.visible = False
+        self.dispatcher.pop()
+
+    def select_option(self, event, step):
+        """Move the dialogue option selection by step"""
+        npc = find_adjacent_npc(self.game, talking=True)
+        if npc:
+            self.dialogue_screen.select(npc, step)
+
+    def choose_option(self, event):
+        """Choose the selected dialogue option, leaving dialogue mode if it ends the conversation"""
+        npc = find_adjacent_npc(self.game, talking=True)
+        if npc:
+            self.dialogue_screen.choose(self.game, npc)
+        if not self.dialogue_screen.visible:
+            self.dispatcher.pop()
+
+    # Pause menu and character screen
+    def resume(self, event):
+        """Close the pause menu"""
+        self.game.is_paused = False
+        self.dispatcher.pop()
+
+    def close_character_screen(self, event):
+        """Close the character screen"""
+        self.game.show_character_screen = False
+        self.dispatcher.pop()
+
+def run_game_loop(context, console, game, renderer, pause_screen, character_screen, main_menu,
+                  inventory_screen, dialogue_screen):
+    """Run the main game loop until the player quits
+
+    The game is updated at a fixed tick rate, independent of input and rendering. A
+    frame is only drawn after input or a tick that changed something, and between
+    ticks the loop sleeps in the event queue.
+    """
+    scheduler = TickScheduler()
+    game_input = GameInput(game, inventory_screen, dialogue_screen)
+    redraw = True
     
     # Main game loop
     while True:
-        # Update game state if not paused and no screens are open
-        if not game.is_paused and not inventory_screen.visible and not game.show_character_screen and not dialogue_screen.visible:
-            game.update()
+        # Run the simulation ticks that are due if not paused and no screens are open
+        for _ in range(scheduler.due_ticks()):
+            if game_input.dispatcher.mode == MODE_GAMEPLAY:
+                redraw = game.update() or redraw
         
-        # Clear the console
-        console.clear()
-        
-        # Render the game map first
-        renderer.render_all(game, game.player, None)
-        
-        # Then render any overlays
-        if game.is_paused:
-            pause_screen.render()
-        elif game.show_character_screen:
-            character_screen.render(game.player)
-        elif inventory_screen.visible:
-            # Draw a semi-transparent background for the inventory
-            for x in range(80):
-                for y in range(50):
-                    console.print(x, y, " ", bg=(0, 0, 0))
-            inventory_screen.render(game.player)
-        elif dialogue_screen.visible:
-            # Draw a semi-transparent background for the dialogue
-            for x in range(80):
-                for y in range(50):
-                    console.print(x, y, " ", bg=(0, 0, 0))
-            # Find the NPC that's currently in dialogue
-            current_map = game.levels[game.current_level]
-            current_npc = None
-            for dx in range(-1, 2):
-                for dy in range(-1, 2):
-                    check_x = game.player.x + dx
-                    check_y = game.player.y + dy
-                    npc = current_map.get_npc_at(check_x, check_y)
-                    if npc and npc.is_talking:
-                        current_npc = npc
-                        break
-                if current_npc:
-                    break
-            if current_npc:
-                dialogue_screen.render(current_npc)
-        
-        # Render NPCs last
-        current_map = game.levels[game.current_level]
-        for npc in current_map.npcs:
-            # Only render NPCs that are visible and not in dialogue
-            if current_map.visible[npc.x, npc.y] and not npc.is_talking:
-                console.print(npc.x, npc.y, npc.char, fg=npc.color)
-        
-        # Present the console
-        tcod.console_flush()
+        if redraw:
+            render_frame(context, console, game, renderer, pause_screen, character_screen,
+                         inventory_screen, dialogue_screen)
+            redraw = False
         
-        # Handle input
-        for event in tcod.event.wait():
-            if isinstance(event, tcod.event.Quit):
+        # Handle all pending input, sleeping until the next tick if there is none. Moves
+        # are applied as they come, but the view is only refreshed once they are all in
+        for event in tcod.event.wait(timeout=scheduler.time_until_tick()):
+            # Any event, including window exposure and resizing, calls for a new frame
+            redraw = True
+            result = game_input.handle(event)
+            if result == GameInput.QUIT:
                 return
-            elif isinstance(event, tcod.event.KeyDown):
-                # Handle dialogue screen input first
-                if dialogue_screen.visible:
-                    current_map = game.levels[game.current_level]
-                    # Find the NPC that's currently in dialogue
-                    current_npc = None
-                    for dx in range(-1, 2):
-                        for dy in range(-1, 2):
-                            check_x = game.player.x + dx
-                            check_y = game.player.y + dy
-                            npc = current_map.get_npc_at(check_x, check_y)
-                            if npc and npc.is_talking:
-                                current_npc = npc
-                                break
-                        if current_npc:
-                            break
-                    if current_npc and dialogue_screen.handle_input(event, current_npc):
-                        continue
-                
-                # Handle inventory screen input
-                if inventory_screen.visible:
-                    if event.sym == tcod.event.KeySym.ESCAPE:
-                        inventory_screen.visible = False
-                    elif event.sym == tcod.event.KeySym.UP:
-                        inventory_screen.selected_index = max(0, inventory_screen.selected_index - 1)
-                    elif event.sym == tcod.event.KeySym.DOWN:
-                        inventory_screen.selected_index = min(len(game.player.inventory) - 1, inventory_screen.selected_index + 1)
-                    elif event.sym == tcod.event.KeySym.SPACE:
-                        if 0 <= inventory_screen.selected_index < len(game.player.inventory):
-                            item = game.player.inventory[inventory_screen.selected_index]
-                            if item.use(game.player):
-                                game.player.inventory.pop(inventory_screen.selected_index)
-                                if inventory_screen.selected_index >= len(game.player.inventory):
-                                    inventory_screen.selected_index = max(0, len(game.player.inventory) - 1)
-                    elif event.sym == tcod.event.KeySym.d:
-                        if 0 <= inventory_screen.selected_index < len(game.player.inventory):
-                            game.player.inventory.pop(inventory_screen.selected_index)
-                            if inventory_screen.selected_index >= len(game.player.inventory):
-                                inventory_screen.selected_index = max(0, len(game.player.inventory) - 1)
-                    continue
-                
-                if event.sym == tcod.event.KeySym.ESCAPE:
-                    # Toggle pause state if no screens are open
-                    if not inventory_screen.visible and not game.show_character_screen and not dialogue_screen.visible:
-                        game.is_paused = not game.is_paused
-                    continue
-                
-                # If game is paused, handle pause menu options
-                if game.is_paused:
-                    if event.sym == tcod.event.KeySym.KP_1 or event.sym == tcod.event.KeySym.N1:
-                        # Resume game
-                        game.is_paused = False
-                    elif event.sym == tcod.event.KeySym.KP_2 or event.sym == tcod.event.KeySym.N2:
-                        # Return to main menu
-                        game = show_main_menu(console, None, renderer, character_screen, pause_screen, main_menu)
-                        if not game:
-                            return
-                        continue
-                    elif event.sym == tcod.event.KeySym.KP_3 or event.sym == tcod.event.KeySym.N3:
-                        # Quit game
-                        return
-                    continue
-                
-                # Handle character screen toggle
-                if event.sym == tcod.event.KeySym.c:
-                    game.show_character_screen = not game.show_character_screen
-                    continue
-                
-                # If character screen is open, ignore other inputs
-                if game.show_character_screen:
-                    continue
-                
-                # Handle inventory screen toggle
-                if event.sym == tcod.event.KeySym.i:
-                    inventory_screen.visible = not inventory_screen.visible
-                    if inventory_screen.visible:
-                        inventory_screen.selected_index = 0
-                        inventory_screen.current_page = 0
-                    continue
-                
-                # Handle NPC interaction
-                if event.sym == tcod.event.KeySym.SPACE:
-                    current_map = game.levels[game.current_level]
-                    # Check for NPCs in a one tile radius
-                    for dx in range(-1, 2):
-                        for dy in range(-1, 2):
-                            check_x = game.player.x + dx
-                            check_y = game.player.y + dy
-                            npc = current_map.get_npc_at(check_x, check_y)
-                            if npc and not dialogue_screen.visible:
-                                dialogue_id = get_dialogue_for_npc(npc)
-                                dialogue_screen.show(npc, dialogue_id)
-                                break
-                        if dialogue_screen.visible:
-                            break
-                    if dialogue_screen.visible:
-                        continue
-                    # Handle save point interaction
-                    elif current_map.is_save_point(game.player.x, game.player.y):
-                        success, message = game.save_game()
-                        game.last_save_point = (game.player.x, game.player.y)
-                        game.last_save_level = game.current_level
-                        game.message = "Game saved!"
-                        game.message_timer = 60  # Show message for 60 frames
-                        continue
-                
-                # Only handle movement if no screens are open and game is not paused
-                if not inventory_screen.visible and not game.show_character_screen and not dialogue_screen.visible and not game.is_paused:
-                    if event.sym == tcod.event.KeySym.UP or event.sym == tcod.event.KeySym.KP_8:
-                        game.try_move(0, -1)  # Move up
-                    elif event.sym == tcod.event.KeySym.DOWN or event.sym == tcod.event.KeySym.KP_2:
-                        game.try_move(0, 1)   # Move down
-                    elif event.sym == tcod.event.KeySym.LEFT or event.sym == tcod.event.KeySym.KP_4:
-                        game.try_move(-1, 0)  # Move left
-                    elif event.sym == tcod.event.KeySym.RIGHT or event.sym == tcod.event.KeySym.KP_6:
-                        game.try_move(1, 0)   # Move right
-                    elif event.sym == tcod.event.KeySym.KP_7:
-                        game.try_move(-1, -1) # Move up-left
-                    elif event.sym == tcod.event.KeySym.KP_9:
-                        game.try_move(1, -1)  # Move up-right
-                    elif event.sym == tcod.event.KeySym.KP_1:
-                        game.try_move(-1, 1)  # Move down-left
-                    elif event.sym == tcod.event.KeySym.KP_3:
-                        game.try_move(1, 1)   # Move down-right
+            elif result == GameInput.MAIN_MENU:
+                # Finish the old game's replay log and saves before the menu reads the saves
+                game.stop_recording()
+                game.wait_for_saves()
+                game = show_main_menu(context, console, main_menu)
+                if not game:
+                    return
+                game_input.start(game)
+        
+        # Recompute the field of view once for all the moves of this frame
+        if game_input.moved:
+            game.refresh_view()
+            game_input.moved = False
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
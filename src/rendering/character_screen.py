@@ -203,7 +203,4 @@ class CharacterScreenRenderer:
             self.y + self.height - 2,
             help_text,
             fg=COLOR_WHITE
-        )
-
-        # Present the console
-        tcod.console_flush() 
\ No newline at end of file
+        )
\ No newline at end of file
@@ -88,42 +88,28 @@ class DialogueScreenRenderer:
                           self.y_offset + self.height - 2, 
                           help_text, fg=(150, 150, 150))
 
-    def handle_input(self, event, npc: NPC) -> bool:
-        """Handle input for the dialogue screen"""
-        if not self.visible or not npc.is_talking:
-            return False
+    def select(self, npc: NPC, step: int):
+        """Move the option selection by step"""
+        current_dialogue = npc.get_current_dialogue()
+        if current_dialogue:
+            self.selected_index = max(0, min(len(current_dialogue.options) - 1, self.selected_index + step))
 
-        if event.type == "KEYDOWN":
-            if event.sym == tcod.event.K_ESCAPE:
+    def choose(self, game, npc: NPC):
+        """Choose the selected option, closing the dialogue if it leads nowhere"""
+        if npc.get_current_dialogue():
+            if not game.choose_dialogue_option(npc, self.selected_index):
                 self.visible = False
-                npc.end_dialogue()
-                return True
-            elif event.sym == tcod.event.K_UP:
-                self.selected_index = max(0, self.selected_index - 1)
-                return True
-            elif event.sym == tcod.event.K_DOWN:
-                current_dialogue = npc.get_current_dialogue()
-                if current_dialogue:
-                    self.selected_index = min(len(current_dialogue.options) - 1, self.selected_index + 1)
-                return True
-            elif event.sym == tcod.event.K_SPACE:
-                current_dialogue = npc.get_current_dialogue()
-                if current_dialogue:
-                    next_dialogue = npc.select_option(self.selected_index)
-                    if next_dialogue:
-                        npc.start_dialogue(next_dialogue)
-                    else:
-                        self.visible = False
-                        npc.end_dialogue()
-                    self.selected_index = 0
-                return True
+            self.selected_index = 0
 
-        return False
+    def close(self, game, npc: NPC):
+        """Close the dialogue screen and end the conversation"""
+        self.visible = False
+        game.end_dialogue(npc)
 
-    def show(self, npc, dialogue_id="greeting"):
-        """Show the dialogue screen for an NPC"""
+    def show(self, game, npc):
+        """Show the dialogue screen for a conversation started with an NPC"""
         self.current_npc = npc
         self.visible = True
         self.selected_index = 0
         self._last_render = None  # Reset render state
-        npc.start_dialogue(dialogue_id) 
\ No newline at end of file
+        game.talk_to(npc) 
\ No newline at end of file
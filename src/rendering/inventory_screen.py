@@ -66,46 +66,25 @@ class InventoryScreenRenderer:
         help_text = "↑/↓: Select  Space: Use  D: Drop  Esc: Close"
         self.console.print(self.x_offset + self.width // 2 - len(help_text) // 2, self.y_offset + self.height - 2, help_text, fg=(150, 150, 150))
 
-    def handle_input(self, event, player):
-        """Handle input for the inventory screen"""
-        if not self.visible:
-            return False
+    def select(self, player, step):
+        """Move the item selection by step, turning the page when it leaves the current one"""
+        self.selected_index = max(0, min(len(player.inventory) - 1, self.selected_index + step))
+        self.current_page = self.selected_index // self.items_per_page
+
+    def use_selected(self, game):
+        """Use the selected item, keeping the selection inside the inventory if it was consumed"""
+        game.use_item(self.selected_index)
+        self.select(game.player, 0)
 
-        if event.type == "KEYDOWN":
-            if event.sym == tcod.event.K_ESCAPE:
-                self.visible = False
-                self._last_render = None  # Reset render state
-                return True
-            elif event.sym == tcod.event.K_UP:
-                self.selected_index = max(0, self.selected_index - 1)
-                # Update page if needed
-                if self.selected_index < self.current_page * self.items_per_page:
-                    self.current_page = max(0, self.current_page - 1)
-                return True
-            elif event.sym == tcod.event.K_DOWN:
-                self.selected_index = min(len(player.inventory) - 1, self.selected_index + 1)
-                # Update page if needed
-                if self.selected_index >= (self.current_page + 1) * self.items_per_page:
-                    self.current_page = min((len(player.inventory) - 1) // self.items_per_page, self.current_page + 1)
-                return True
-            elif event.sym == tcod.event.K_RETURN:
-                # Use selected item
-                if 0 <= self.selected_index < len(player.inventory):
-                    item = player.inventory[self.selected_index]
-                    if item.use(player):
-                        player.inventory.pop(self.selected_index)
-                        if self.selected_index >= len(player.inventory):
-                            self.selected_index = max(0, len(player.inventory) - 1)
-                return True
-            elif event.sym == tcod.event.K_d:
-                # Drop selected item
-                if 0 <= self.selected_index < len(player.inventory):
-                    player.inventory.pop(self.selected_index)
-                    if self.selected_index >= len(player.inventory):
-                        self.selected_index = max(0, len(player.inventory) - 1)
-                return True
+    def drop_selected(self, game):
+        """Drop the selected item, keeping the selection inside the inventory"""
+        game.drop_item(self.selected_index)
+        self.select(game.player, 0)
 
-        return False
+    def close(self):
+        """Close the inventory screen"""
+        self.visible = False
+        self._last_render = None  # Reset render state
 
     def toggle(self):
         """Toggle the inventory screen visibility"""
@@ -10,8 +10,8 @@ class MainMenuRenderer:
         self.x = (console.width - self.width) // 2
         self.y = (console.height - self.height) // 2
 
-    def render(self, has_save=False):
-        """Render the main menu"""
+    def render(self, has_save=False, latest_save=None):
+        """Render the main menu, with a preview of the latest save entry if given"""
         # Draw the background
         for x in range(self.width):
             for y in range(self.height):
@@ -49,7 +49,7 @@ class MainMenuRenderer:
         # Draw menu options
         options = [
             "1. New Game",
-            "2. Load Last Save" if has_save else "2. No Save File Found",
+            "2. Load Game" if has_save else "2. No Save File Found",
             "3. Exit"
         ]
         
@@ -60,4 +60,46 @@ class MainMenuRenderer:
                 self.y + 4 + i,
                 option,
                 fg=color
-            ) 
\ No newline at end of file
+            ) 
+
+        # Draw a preview of the latest save
+        if latest_save:
+            preview = format_save_entry(latest_save)
+            self.console.print(
+                self.x + (self.width - len(preview)) // 2,
+                self.y + 8,
+                preview,
+                fg=COLOR_GRAY
+            )
+
+    def render_save_list(self, entries, selected_index):
+        """Render a scrollable list of save manifest entries"""
+        width = 60
+        height = 30
+        x0 = (self.console.width - width) // 2
+        y0 = (self.console.height - height) // 2
+        self.console.draw_frame(x0, y0, width, height, "Load Game", fg=COLOR_WHITE, bg=COLOR_BLACK)
+
+        # Scroll so the selected entry stays visible
+        rows = height - 4
+        first = max(0, min(selected_index - rows // 2, len(entries) - rows))
+        for row, entry in enumerate(entries[first:first + rows]):
+            index = first + row
+            color = COLOR_YELLOW if index == selected_index else COLOR_WHITE
+            prefix = ">" if index == selected_index else " "
+            self.console.print(x0 + 2, y0 + 1 + row, f"{prefix} {format_save_entry(entry)}"[:width - 4], fg=color)
+
+        help_text = "Up/Down: Select  Enter: Load  Esc: Back"
+        self.console.print(x0 + (width - len(help_text)) // 2, y0 + height - 2, help_text, fg=COLOR_GRAY)
+
+def format_play_time(seconds):
+    """Format a play time in seconds as H:MM:SS"""
+    seconds = int(seconds)
+    return f"{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+def format_save_entry(entry):
+    """Format a save manifest entry as a one-line preview"""
+    timestamp = entry['timestamp']
+    date = f"{timestamp[0:4]}-{timestamp[4:6]}-{timestamp[6:8]} {timestamp[9:11]}:{timestamp[11:13]}"
+    return (f"{date}  Depth {entry['current_level']}  Lv {entry['player_level']}  "
+            f"{format_play_time(entry['play_time'])}")
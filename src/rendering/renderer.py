@@ -40,9 +40,6 @@ class Renderer:
         if game.show_character_screen:
             self.character_screen.render(player)
 
-        # Present the console
-        tcod.console_flush()
-
     def get_terrain_color(self, terrain, is_visible, is_outdoor, level=0):
         """Get the appropriate color for terrain based on type, visibility, and level"""
         # Base colors for different terrain types
@@ -0,0 +1,117 @@
+# Tileset loading with a cache of decoded glyphs
+#
+# Each tilesheet PNG is decoded once into an array of RGBA glyphs, which is written to
+# the cache keyed by the hash of the file and its layout. Later launches build the
+# tileset straight from the cached array, and other fonts or integer scales of a loaded
+# font are built from the glyphs in memory.
+import hashlib
+import io
+import os
+from dataclasses import dataclass
+
+import numpy as np
+import tcod
+
+from core.saving import write_atomic
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TILESET_CACHE_DIR = os.path.join("cache", "tilesets")
+TILESET_CACHE_VERSION = 1  # Part of every cache key; bump to invalidate old caches
+
+@dataclass(frozen=True)
+class FontSpec:
+    path: str
+    columns: int
+    rows: int
+    charmap: str  # Name of a tcod.tileset character map, e.g. "CHARMAP_TCOD"
+
+FONTS = {
+    'dejavu10x10': FontSpec(os.path.join(SRC_DIR, "assets", "dejavu10x10_gs_tc.png"), 32, 8, "CHARMAP_TCOD"),
+    'terminal8x8': FontSpec(os.path.join(os.path.dirname(SRC_DIR), "data", "fonts", "terminal8x8_gs_ro.png"),
+                            16, 16, "CHARMAP_CP437"),
+}
+DEFAULT_FONT = 'dejavu10x10'
+
+def font_cache_key(font, data):
+    """Get the cache key of a font from its layout and the bytes of its PNG"""
+    digest = hashlib.sha256(data)
+    digest.update(f"{TILESET_CACHE_VERSION}:{font.columns}x{font.rows}:{font.charmap}".encode())
+    return digest.hexdigest()
+
+def decode_glyphs(font):
+    """Decode a tilesheet into (codepoints, glyphs), glyphs being an (n, height, width, 4) RGBA array"""
+    charmap = getattr(tcod.tileset, font.charmap)
+    tileset = tcod.tileset.load_tilesheet(font.path, font.columns, font.rows, charmap)
+    codepoints = np.array(charmap[:font.columns * font.rows], dtype=np.int32)
+    return codepoints, np.stack([tileset.get_tile(int(codepoint)) for codepoint in codepoints])
+
+def build_tileset(codepoints, glyphs, scale=1):
+    """Build a tileset from decoded glyphs, enlarging each pixel to scale x scale"""
+    if scale != 1:
+        glyphs = glyphs.repeat(scale, axis=1).repeat(scale, axis=2)
+    tileset = tcod.tileset.Tileset(glyphs.shape[2], glyphs.shape[1])
+    for codepoint, glyph in zip(codepoints.tolist(), glyphs):
+        tileset.set_tile(codepoint, glyph)
+    return tileset
+
+class TilesetManager:
+    def __init__(self, fonts=FONTS, cache_dir=TILESET_CACHE_DIR):
+        """Initialize a manager of the given fonts, caching decoded glyphs in cache_dir"""
+        self.fonts = fonts
+        self.cache_dir = cache_dir
+        self.glyphs = {}  # Font name -> (codepoints, glyphs)
+        self.tilesets = {}  # (font name, scale) -> tileset
+        self.font = DEFAULT_FONT if DEFAULT_FONT in fonts else next(iter(fonts))
+        self.scale = 1
+
+    def get_glyphs(self, name):
+        """Get the decoded glyphs of a font, from memory, the cache or its PNG"""
+        if name in self.glyphs:
+            return self.glyphs[name]
+
+        font = self.fonts[name]
+        with open(font.path, "rb") as f:
+            key = font_cache_key(font, f.read())
+        cache_path = os.path.join(self.cache_dir, f"{key}.npz")
+        try:
+            with np.load(cache_path) as cached:
+                glyphs = (cached['codepoints'], cached['glyphs'])
+        except (OSError, ValueError, KeyError):
+            glyphs = decode_glyphs(font)
+            buffer = io.BytesIO()
+            np.savez(buffer, codepoints=glyphs[0], glyphs=glyphs[1])
+            try:
+                write_atomic(cache_path, buffer.getvalue())
+            except OSError:
+                pass  # The cache only speeds up later launches
+        self.glyphs[name] = glyphs
+        return glyphs
+
+    def get_tileset(self, name=None, scale=None):
+        """Get the tileset of a font at an integer scale, defaulting to the current ones"""
+        name = name or self.font
+        scale = scale or self.scale
+        if (name, scale) not in self.tilesets:
+            self.tilesets[name, scale] = build_tileset(*self.get_glyphs(name), scale)
+        return self.tilesets[name, scale]
+
+    def apply(self, context, name=None, scale=None):
+        """Switch a context to a font and scale, making them current"""
+        tileset = self.get_tileset(name, scale)
+        context.change_tileset(tileset)
+        self.font = name or self.font
+        self.scale = scale or self.scale
+        return tileset
+
+    def cycle_font(self, context):
+        """Switch a context to the next font that loads, returning its name"""
+        names = list(self.fonts)
+        start = names.index(self.font)
+        for offset in range(1, len(names) + 1):
+            name = names[(start + offset) % len(names)]
+            try:
+                self.apply(context, name)
+                return name
+            except (OSError, RuntimeError):
+                continue  # Missing or undecodable tilesheet
+        return self.font
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# Monte-Carlo combat balance simulator
+#
+# Player stats are computed once per build and level with the real Player class, then
+# millions of attack exchanges are sampled in whole arrays with NumPy's RNG. The game
+# does not resolve player attacks yet, so hit and critical hit damage come from
+# Player.calculate_damage_dealt and its CRITICAL_HIT_MULTIPLIER.
+import argparse
+import os
+import sys
+from dataclasses import dataclass, field
+from typing import List
+
+import numpy as np
+
+# Add the src directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.player import Player, Attribute, Skill, DAMAGE_TYPE_MULTIPLIERS, CRITICAL_HIT_MULTIPLIER
+
+CHUNK_SIZE = 100_000  # Samples per chunk when a (samples x hits) matrix is needed
+
+@dataclass
+class Build:
+    name: str
+    attributes: List[Attribute]  # Attributes to raise, cycled on every attribute point
+    skills: List[Skill] = field(default_factory=list)  # Skills to raise, cycled on every skill point
+
+@dataclass
+class Enemy:
+    hp: int = 200
+    damage: int = 30
+    damage_type: str = "physical"
+
+BUILDS = {
+    "warrior": Build("warrior", [Attribute.STRENGTH, Attribute.VITALITY], [Skill.SWORD_MASTERY]),
+    "tank": Build("tank", [Attribute.VITALITY], [Skill.SHIELD_BLOCK]),
+    "rogue": Build("rogue", [Attribute.DEXTERITY], [Skill.EVASION, Skill.SWORD_MASTERY]),
+    "cleric": Build("cleric", [Attribute.FAITH, Attribute.VITALITY], [Skill.HEALING, Skill.SHIELD_BLOCK]),
+}
+
+def build_player(build, level):
+    """Create a Player at the given level with points spent according to the build"""
+    player = Player(0, 0)
+    attribute_index = 0
+    skill_index = 0
+    for _ in range(level - 1):
+        player.level_up()
+        while player.attribute_points > 0 and build.attributes:
+            player.increase_attribute(build.attributes[attribute_index % len(build.attributes)])
+            attribute_index += 1
+        while player.skill_points > 0 and build.skills:
+            player.increase_skill(build.skills[skill_index % len(build.skills)])
+            skill_index += 1
+    return player
+
+def sample_turns_to_die(player, enemy, samples, rng):
+    """Sample how many enemy attacks the player survives before dying"""
+    hit_damage = player.calculate_damage_taken(enemy.damage, enemy.damage_type)
+    if hit_damage <= 0:
+        return np.full(samples, np.inf)
+
+    # The player dies after a fixed number of landed hits; dodges are Bernoulli failures
+    # before each of them, so the total is a negative binomial draw
+    hits_needed = -(-player.max_hp // hit_damage)
+    hit_chance = 1.0 - player.dodge_chance
+    return hits_needed + rng.negative_binomial(hits_needed, hit_chance, size=samples)
+
+def sample_turns_to_kill(player, enemy, samples, rng):
+    """Sample how many player attacks it takes to kill the enemy"""
+    base_damage = player.calculate_damage_dealt()
+    critical_damage = player.calculate_damage_dealt(critical=True)
+    if base_damage <= 0:
+        return np.full(samples, np.inf)
+
+    # Without crits the enemy dies after max_hits hits, which bounds the matrix width
+    max_hits = -(-enemy.hp // base_damage)
+    turns = np.empty(samples, dtype=np.int64)
+    for start in range(0, samples, CHUNK_SIZE):
+        count = min(CHUNK_SIZE, samples - start)
+        crits = rng.random((count, max_hits)) < player.critical_chance
+        damage = np.where(crits, critical_damage, base_damage)
+        dealt = np.cumsum(damage, axis=1)
+        turns[start:start + count] = np.argmax(dealt >= enemy.hp, axis=1) + 1
+    return turns
+
+def simulate(build, level, enemy, samples, rng):
+    """Simulate one build at one level and return a dict of metrics"""
+    player = build_player(build, level)
+    turns_to_die = sample_turns_to_die(player, enemy, samples, rng)
+    turns_to_kill = sample_turns_to_kill(player, enemy, samples, rng)
+
+    # Expected fraction of raw enemy damage that reaches the player's HP
+    damage_taken_ratio = ((1 - player.dodge_chance) * (1 - player.damage_reduction)
+                          * DAMAGE_TYPE_MULTIPLIERS.get(enemy.damage_type, 1.0))
+    expected_dps = ((1 - player.critical_chance) * player.calculate_damage_dealt()
+                    + player.critical_chance * player.calculate_damage_dealt(critical=True))
+
+    return {
+        'build': build.name,
+        'level': level,
+        'max_hp': player.max_hp,
+        'effective_hp': player.max_hp / damage_taken_ratio if damage_taken_ratio > 0 else np.inf,
+        'dps': expected_dps,
+        'ttk_mean': float(np.mean(turns_to_kill)),
+        'ttk_p10': float(np.percentile(turns_to_kill, 10)),
+        'ttk_p90': float(np.percentile(turns_to_kill, 90)),
+        'ttd_mean': float(np.mean(turns_to_die)),
+        'ttd_p10': float(np.percentile(turns_to_die, 10)),
+        'ttd_p90': float(np.percentile(turns_to_die, 90)),
+        'win_rate': float(np.mean(turns_to_kill <= turns_to_die)),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Monte-Carlo combat balance simulator",
+        epilog=f"The game does not resolve player attacks yet; critical hits are assumed to deal "
+               f"{CRITICAL_HIT_MULTIPLIER:g}x damage (CRITICAL_HIT_MULTIPLIER in core/player.py).")
+    parser.add_argument("--builds", nargs="+", default=list(BUILDS), choices=list(BUILDS))
+    parser.add_argument("--max-level", type=int, default=10)
+    parser.add_argument("--samples", type=int, default=1_000_000)
+    parser.add_argument("--enemy-hp", type=int, default=200)
+    parser.add_argument("--enemy-damage", type=int, default=30)
+    parser.add_argument("--damage-type", default="physical")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    enemy = Enemy(args.enemy_hp, args.enemy_damage, args.damage_type)
+
+    header = f"{'build':<8} {'lvl':>3} {'maxHP':>6} {'effHP':>8} {'DPS':>6} {'TTK':>6} {'TTK p10-p90':>12} {'TTD':>7} {'TTD p10-p90':>12} {'win':>6}"
+    print(header)
+    print("-" * len(header))
+    for name in args.builds:
+        for level in range(1, args.max_level + 1):
+            r = simulate(BUILDS[name], level, enemy, args.samples, rng)
+            print(f"{r['build']:<8} {r['level']:>3} {r['max_hp']:>6} {r['effective_hp']:>8.1f} {r['dps']:>6.1f} "
+                  f"{r['ttk_mean']:>6.2f} {r['ttk_p10']:>5.0f}-{r['ttk_p90']:<6.0f} "
+                  f"{r['ttd_mean']:>7.2f} {r['ttd_p10']:>5.0f}-{r['ttd_p90']:<6.0f} {r['win_rate']:>6.1%}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+# Replay recorded sessions headlessly at full speed and check their final state hashes
+import argparse
+import os
+import sys
+import time
+
+# Add the src directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.replay import run_replay, read_replay
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded sessions and verify their state hashes")
+    parser.add_argument("replays", nargs="+", help="Replay log files (.rpl)")
+    args = parser.parse_args()
+
+    failures = 0
+    for path in args.replays:
+        try:
+            _, records = read_replay(path)
+        except ValueError as e:
+            print(f"{e} (UNREADABLE)")
+            failures += 1
+            continue
+        start = time.perf_counter()
+        _, expected, actual = run_replay(path)
+        elapsed = time.perf_counter() - start
+
+        if not expected:
+            status = "NO HASH"
+        elif expected == actual:
+            status = "OK"
+        else:
+            status = "MISMATCH"
+            failures += 1
+        print(f"{path}: {len(records)} records in {elapsed:.3f}s ({status})")
+
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# Constraint-driven seed search over the level generator
+#
+# Constraints are written LEVEL:METRIC OP VALUE, e.g. "1:stairs_path_length>60",
+# "3:room_treasure>=2", "0:healer_reachable==1" or "2:main_path_water==0". Levels are
+# generated the same way as tools/generate_maps.py does; at the game's 80x50 size they
+# are the levels a Game(seed) builds. A candidate seed is rejected at the
+# first failing constraint, checking cheap layout metrics before pathing ones and
+# generating deeper levels only once the shallower ones pass.
+import argparse
+import operator
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+
+# Add the src directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.analytics import room_type_counts, stairs_path_length, main_path, terrain_near_path, npc_reachable
+from core.map import TERRAIN_WATER
+from core.regions import label_regions
+from core.rooms import ROOM_TYPES
+from tools.generate_maps import generate_level, parse_size
+from utils.constants import MAP_WIDTH, MAP_HEIGHT
+
+# Evaluation phases, cheapest first
+PHASE_LAYOUT = 0   # Read straight off the generated level
+PHASE_PATHS = 1    # Needs a distance transform or region labeling
+PHASE_MAIN_PATH = 2  # Needs the traced entry-to-exit path
+
+def _main_path_length(game_map):
+    path = main_path(game_map)
+    return -1 if path is None else len(path[0]) - 1
+
+def _main_path_water(game_map):
+    path = main_path(game_map)
+    return -1 if path is None else terrain_near_path(game_map, path, TERRAIN_WATER)
+
+# Metrics that constraints can use: name -> (phase, function of a Map)
+METRICS = {
+    'rooms': (PHASE_LAYOUT, lambda game_map: len(game_map.rooms)),
+    'npcs': (PHASE_LAYOUT, lambda game_map: len(game_map.npcs)),
+    'walkable_fraction': (PHASE_LAYOUT, lambda game_map: float(game_map.walkable_mask().mean())),
+    'region_count': (PHASE_PATHS, lambda game_map: len(label_regions(game_map.walkable_mask())[1])),
+    'stairs_path_length': (PHASE_PATHS, stairs_path_length),
+    'healer_reachable': (PHASE_PATHS, lambda game_map: int(npc_reachable(game_map, "Healer"))),
+    'merchant_reachable': (PHASE_PATHS, lambda game_map: int(npc_reachable(game_map, "Merchant"))),
+    'guide_reachable': (PHASE_PATHS, lambda game_map: int(npc_reachable(game_map, "Guide"))),
+    'main_path_length': (PHASE_MAIN_PATH, _main_path_length),
+    'main_path_water': (PHASE_MAIN_PATH, _main_path_water),  # Water tiles within one tile of the main path
+}
+for _index, _room_type in enumerate(ROOM_TYPES):
+    METRICS[f'room_{_room_type}'] = (PHASE_LAYOUT, lambda game_map, i=_index: int(room_type_counts(game_map)[i]))
+
+OPERATORS = {'>=': operator.ge, '<=': operator.le, '==': operator.eq, '!=': operator.ne,
+             '>': operator.gt, '<': operator.lt}
+CONSTRAINT_PATTERN = re.compile(r"^(\d+):(\w+)\s*(>=|<=|==|!=|>|<)\s*(-?[\d.]+)$")
+
+@dataclass
+class Constraint:
+    level: int
+    metric: str
+    op: str
+    value: float
+
+    def __str__(self):
+        return f"{self.level}:{self.metric}{self.op}{self.value:g}"
+
+def parse_constraint(text):
+    """Parse a LEVEL:METRIC OP VALUE constraint"""
+    match = CONSTRAINT_PATTERN.match(text.strip())
+    if not match:
+        raise argparse.ArgumentTypeError(f"invalid constraint {text!r}, expected LEVEL:METRIC OP VALUE")
+    level, metric, op, value = match.groups()
+    if metric not in METRICS:
+        raise argparse.ArgumentTypeError(f"unknown metric {metric!r}, choose from {', '.join(METRICS)}")
+    return Constraint(int(level), metric, op, float(value))
+
+def check_seed(seed, constraints, width, height):
+    """Return {"LEVEL:METRIC": value} if a seed satisfies every constraint, else None
+
+    Constraints must be sorted by (level, phase).
+    """
+    values = {}
+    game_map = None
+    for constraint in constraints:
+        if game_map is None or game_map.level != constraint.level:
+            game_map = generate_level(seed, constraint.level, width, height)
+        value = METRICS[constraint.metric][1](game_map)
+        if not OPERATORS[constraint.op](value, constraint.value):
+            return None  # Early rejection: later phases and deeper levels are never computed
+        values[f"{constraint.level}:{constraint.metric}"] = value
+    return values
+
+def main():
+    parser = argparse.ArgumentParser(description="Search for seeds whose levels satisfy constraints")
+    parser.add_argument("constraints", nargs="+", type=parse_constraint, help="Constraints as LEVEL:METRIC OP VALUE")
+    parser.add_argument("--seeds", type=int, nargs=2, default=[0, 100_000], metavar=("START", "STOP"),
+                        help="Range of seeds to search (STOP excluded)")
+    parser.add_argument("--count", type=int, default=10, help="Stop after finding this many seeds")
+    parser.add_argument("--size", type=parse_size, default=(MAP_WIDTH, MAP_HEIGHT),
+                        help=f"Map size as WIDTHxHEIGHT (default: the game's {MAP_WIDTH}x{MAP_HEIGHT})")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--batch", type=int, default=256, help="Seeds handed to each worker at a time")
+    args = parser.parse_args()
+
+    constraints = sorted(args.constraints, key=lambda c: (c.level, METRICS[c.metric][0]))
+    check = partial(check_seed, constraints=constraints, width=args.size[0], height=args.size[1])
+    workers = args.workers or os.cpu_count() or 1
+
+    found = 0
+    searched = 0
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # Search in blocks so the search stops soon after enough seeds are found
+        block = args.batch * workers
+        for block_start in range(args.seeds[0], args.seeds[1], block):
+            seeds = range(block_start, min(block_start + block, args.seeds[1]))
+            for seed, values in zip(seeds, executor.map(check, seeds, chunksize=args.batch)):
+                searched += 1
+                if values is not None:
+                    found += 1
+                    print(seed, " ".join(f"{name}={value:g}" for name, value in values.items()), flush=True)
+                    if found >= args.count:
+                        break
+            if found >= args.count:
+                break
+
+    elapsed = time.perf_counter() - start
+    print(f"Found {found} seeds in {searched} candidates in {elapsed:.2f}s with {workers} workers", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
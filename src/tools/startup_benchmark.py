@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# Startup benchmark: import time and time to the first menu and game frames
+#
+# Every run measures a fresh interpreter, so module caches from earlier runs don't hide
+# import costs. Frames are drawn to an offscreen console; opening the window itself is
+# not included.
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules main.py used to import before showing the menu
+EAGER_MODULES = ("core.game", "core.items", "rendering.renderer", "rendering.character_screen",
+                 "rendering.pause_screen", "rendering.inventory_screen", "rendering.dialogue_screen")
+
+STAGES = ("import_main", "first_menu_frame", "import_game", "new_game", "first_game_frame")
+
+def measure_startup(seed):
+    """Time the startup stages in this interpreter, returning {stage: seconds since start}"""
+    start = time.perf_counter()
+    timings = {}
+    sys.path.insert(0, SRC_DIR)
+
+    import main
+    timings['import_main'] = time.perf_counter() - start
+
+    import tcod
+    from utils.constants import SAVE_DIR
+    console = tcod.console.Console(80, 50, order="F")
+    main.MainMenuRenderer(console).render(bool(main.list_save_entries(SAVE_DIR)))
+    timings['first_menu_frame'] = time.perf_counter() - start
+
+    # What follows happens after the player picks "New Game"
+    import importlib
+    for module in EAGER_MODULES:
+        importlib.import_module(module)
+    timings['import_game'] = time.perf_counter() - start
+
+    from core.game import Game
+    game = Game(seed=seed)
+    timings['new_game'] = time.perf_counter() - start
+
+    renderer = main.create_game_screens(console)[0]
+    current_map = game.levels[game.current_level]
+    renderer.map_renderer.render_map(current_map, game.player.x, game.player.y)
+    renderer.map_renderer.render_stairs(current_map)
+    renderer.ui_renderer.render_ui(game, game.player, current_map)
+    timings['first_game_frame'] = time.perf_counter() - start
+    return timings
+
+def run_child(seed):
+    """Measure one startup in a fresh interpreter"""
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", "--seed", str(seed)],
+                            check=True, capture_output=True, text=True, cwd=os.path.dirname(SRC_DIR)).stdout
+    return json.loads(output.splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure import time and time to the first frames")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters to measure")
+    parser.add_argument("--seed", type=int, default=0, help="World seed of the new game")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure_startup(args.seed)))
+        return
+
+    runs = [run_child(args.seed) for _ in range(args.runs)]
+    print(f"{'stage':<18} {'median':>9} {'min':>9} {'max':>9}  (cumulative ms in a fresh interpreter, {args.runs} runs)")
+    for stage in STAGES:
+        values = [run[stage] * 1000 for run in runs]
+        print(f"{stage:<18} {statistics.median(values):9.1f} {min(values):9.1f} {max(values):9.1f}")
+
+if __name__ == "__main__":
+    main()
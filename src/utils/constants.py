@@ -1,7 +1,13 @@
 # Game constants
 SCREEN_WIDTH = 100
 SCREEN_HEIGHT = 60
-MAP_WIDTH = 100
-MAP_HEIGHT = 60
+MAP_WIDTH = 80   # Width of every level in tiles
+MAP_HEIGHT = 50  # Height of every level in tiles
 MAX_LEVELS = 10  # Maximum number of levels in the game
-FOV_RADIUS = 6   # Radius of the player's field of view 
\ No newline at end of file
+FOV_RADIUS = 6   # Radius of the player's field of view
+TICK_RATE = 30  # Simulation ticks per second, independent of the frame rate
+MESSAGE_DURATION = 2.0  # Seconds a message stays on screen
+SAVE_DIR = "saves"  # Directory for save files
+MEMMAP_LEVELS = False  # Keep level arrays in memory-mapped files (large-map configuration)
+OUTDOOR_TERRAIN = "patches"  # Outdoor terrain generator: "patches" or "noise" (scales to large overworlds)
+DUNGEON_LAYOUT = "scatter"  # Dungeon room layout: "scatter" or "bsp" (bounded work on dense or large maps)
@@ -0,0 +1,27 @@
+# Levels must count as changed after any mutation of their saved state
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from core.game import Game
+
+def test_view_and_stairs_changes_mark_level_dirty():
+    game = Game(seed=7)
+    game.initialize_level(1)
+    level = game.levels[1]
+    x, y = level.stairs_up
+    level.update_fov(x, y)
+    level.mark_saved()
+
+    level.update_fov(x, y)
+    assert not level.has_unsaved_changes()
+
+    level.visible[:] = False  # The next refresh changes what is visible
+    level.update_fov(x, y)
+    assert level.has_unsaved_changes()
+
+    level.mark_saved()
+    level.stairs_discovered["down"] = False
+    level.discover_stairs("down")
+    assert level.has_unsaved_changes()
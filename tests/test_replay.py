@@ -0,0 +1,48 @@
+# Recorded sessions must replay to the same state
+import os
+import struct
+import sys
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from core.game import Game
+from core.player import Player
+from core.replay import HEADER_FORMAT, REPLAY_MAGIC, read_replay, run_replay
+
+def test_replay_reproduces_items_and_dialogue(tmp_path, monkeypatch):
+    # Start wounded, so the health potion is consumed and changes hp
+    player_init = Player.__init__
+    def wounded_init(self, *args, **kwargs):
+        player_init(self, *args, **kwargs)
+        self.hp = self.max_hp // 2
+    monkeypatch.setattr(Player, "__init__", wounded_init)
+
+    game = Game(seed=3)
+    game.save_dir = str(tmp_path)
+    game.start_recording(str(tmp_path))
+    healer = next(npc for npc in game.levels[0].npcs if npc.name == "Healer")
+    game.talk_to(healer)
+    game.choose_dialogue_option(healer, 0)  # Accept the potion
+    game.end_dialogue(healer)
+    for dx, dy in ((1, 0), (0, 1), (-1, 0)):
+        game.try_move(dx, dy)
+    hp = game.player.hp
+    assert game.use_item(0)
+    assert game.player.hp > hp
+    game.try_move(0, -1)
+    path = game.recorder.path
+    game.stop_recording()
+
+    replayed, expected, actual = run_replay(path)
+    assert expected == actual
+    assert replayed.player.hp == game.player.hp
+    assert replayed.player.inventory == []
+    assert next(npc for npc in replayed.levels[0].npcs if npc.name == "Healer").has_given_potion
+
+def test_older_replay_versions_are_rejected(tmp_path):
+    path = tmp_path / "old.rpl"
+    path.write_bytes(struct.pack(HEADER_FORMAT, REPLAY_MAGIC, 2, 0))
+    with pytest.raises(ValueError, match="version 2"):
+        read_replay(str(path))
@@ -0,0 +1,51 @@
+# Retention and garbage collection of the level blob store
+import os
+import sys
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from core import saving
+from core.saving import SaveStore, list_save_entries
+
+def write_saves(store, world_id, hours):
+    for minute, hour in enumerate(hours):
+        timestamp = f"20260101_{hour:02d}{minute:02d}00"
+        save_data = {'saved_at': timestamp, 'world_id': world_id,
+                     'levels': {0: {'world': world_id, 'minute': minute}}}
+        success, message = store.write(os.path.join(store.save_dir, f"save_{world_id}_{timestamp}.sav"), save_data)
+        assert success, message
+
+def test_retention_keeps_other_worlds(tmp_path):
+    write_saves(SaveStore(str(tmp_path), keep_last=1), "a", [1, 1, 1])
+    write_saves(SaveStore(str(tmp_path), keep_last=1), "b", [2, 2, 2])
+
+    entries = list_save_entries(str(tmp_path))
+    # One save per hour survives in each world, including world a's
+    assert sorted(entry['world'] for entry in entries) == ["a", "b"]
+    for entry in entries:
+        assert len(entry['blobs']) == 1
+        assert os.path.exists(SaveStore(str(tmp_path)).blob_path(entry['blobs'][0]))
+
+def test_garbage_collection_reads_only_the_manifest(tmp_path, monkeypatch):
+    store = SaveStore(str(tmp_path), keep_last=1)
+    write_saves(store, "a", [1])
+
+    def read_save(path):
+        raise AssertionError(f"opened {path}")
+    monkeypatch.setattr(saving, "read_save", read_save)
+    write_saves(store, "a", [1, 1])
+    assert len(list_save_entries(str(tmp_path))) == 1
+
+def test_save_after_changing_save_dir(tmp_path):
+    from core.game import Game
+    game = Game(seed=1)
+    game.save_dir = str(tmp_path / "first")
+    assert game.save_game()[0]
+    assert game.save_game()[0]  # Leaves every level saved and unchanged
+
+    # Unchanged levels must be written in full to a new directory
+    game.save_dir = str(tmp_path / "second")
+    success, message = game.save_game()
+    assert success, message
+    path = os.path.join(game.save_dir, list_save_entries(game.save_dir)[0]['path'])
+    assert game.load_game(path)[0]
@@ -0,0 +1,25 @@
+# Levels built by the tools must be the levels a Game with the same seed plays
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from core.game import Game
+from tools.generate_maps import generate_level
+
+def test_tool_levels_match_game_levels():
+    for seed in (5, 44):
+        game = Game(seed=seed)
+        for level in (1, 2, 3):
+            game.initialize_level(level)
+            generated = generate_level(seed, level, game.width, game.height)
+            assert np.array_equal(game.levels[level].tiles, generated.tiles)
+            assert game.levels[level].stairs_up == generated.stairs_up
+            assert game.levels[level].stairs_down == generated.stairs_down
+
+def test_levels_do_not_depend_on_visiting_order():
+    game = Game(seed=7)
+    game.initialize_level(3)
+    assert np.array_equal(game.levels[3].tiles, generate_level(7, 3, game.width, game.height).tiles)